@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import os
+import queue
+import sys
+import threading
+import time
+
+class AccessLog:
+    """异步访问日志
+
+    请求线程只把一条紧凑的记录放进内存队列，由单独的写线程批量写到
+    文件或标准输出，文件超过大小后自动轮转。队列满时直接丢弃并计数，
+    日志永远不会阻塞请求。
+    """
+
+    def __init__(self, path=None, max_queue=10000, max_bytes=10 * 1024 * 1024,
+                 backup_count=3, batch_size=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._size = 0
+        self._last_second = None
+        self._last_text = ''
+
+    def log(self, method, path, client_ip, status, size):
+        """记录一次请求（只入队，不做格式化和IO）"""
+        self._put((time.time(), method, path, client_ip, status, size))
+
+    def message(self, text):
+        """记录一条普通文本"""
+        self._put((time.time(), text))
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'dropped': self.dropped,
+            'written': self.written,
+        }
+
+    def close(self):
+        """写完队列中剩余的记录并停止写线程"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            return
+        self._thread.join(timeout=2)
+        self._thread = None
+
+    def _put(self, record):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # 不加锁：计数偶尔少算也比阻塞请求线程好
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is None:
+                    running = False
+                    continue
+                lines.append(self._format(record))
+            if lines:
+                self._write(''.join(lines))
+                self.written += len(lines)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _format(self, record):
+        # 同一秒内的记录复用格式化好的时间
+        second = int(record[0])
+        if second != self._last_second:
+            self._last_second = second
+            self._last_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        if len(record) == 2:
+            return f"[{self._last_text}] {record[1]}\n"
+        _, method, path, client_ip, status, size = record
+        return f"[{self._last_text}] {method} {path} from {client_ip} {status} {size}\n"
+
+    def _write(self, text):
+        try:
+            if self.path is None or self.path == '-':
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                return
+            data = text.encode('utf-8')
+            if self._file is None:
+                self._open()
+            elif self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except Exception as e:
+            sys.stderr.write(f"写访问日志失败: {e}\n")
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        """access.log -> access.log.1 -> access.log.2 ..."""
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import collections
+import socket
+import threading
+
+from metrics import metrics
+
+# 过载时直接返回的503响应（预先编码好）
+SERVICE_UNAVAILABLE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Length: 0\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+
+def shed_connection(client_socket, client_address):
+    """在accept路径上拒绝连接：写出503后立即关闭，不解析请求、不创建线程
+
+    socket里已经到达的请求先不阻塞地读掉，否则关闭时内核会发送RST，
+    客户端可能还没读到503就收到连接重置。
+    """
+    metrics.connection_shed(client_address[0] if client_address else 'unknown')
+    flags = getattr(socket, 'MSG_DONTWAIT', 0)
+    try:
+        try:
+            client_socket.recv(65536, flags)
+        except OSError:
+            pass
+        client_socket.send(SERVICE_UNAVAILABLE, flags)
+    except OSError:
+        pass
+    finally:
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
+class Admission:
+    """每个连接一个线程模式下的准入控制
+
+    最多 max_active 个连接同时被处理；超出后最多 max_queued 个连接排队，
+    由处理完连接的线程接着处理（不为排队的连接创建线程）；两者都满时
+    直接用 shed_connection 返回503。被接纳的客户端延迟不会因为过载的
+    连接数而一起变差。
+    """
+
+    def __init__(self, max_active, max_queued=0):
+        if max_active < 1:
+            raise ValueError("最大并发连接数必须大于0")
+        if max_queued < 0:
+            raise ValueError("排队长度不能小于0")
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = collections.deque()
+
+    def submit(self, client_socket, client_address):
+        """accept到一个连接时调用，返回True表示调用者应立即开始处理它"""
+        with self._lock:
+            if self._active < self.max_active:
+                self._active += 1
+                return True
+            if len(self._queue) < self.max_queued:
+                self._queue.append((client_socket, client_address))
+                return False
+        shed_connection(client_socket, client_address)
+        return False
+
+    def serve(self, handler, client_socket, client_address):
+        """处理一个已接纳的连接，之后接着处理排队的连接，队列空了再让出名额"""
+        while True:
+            try:
+                handler(client_socket, client_address)
+            except Exception as e:
+                print(f"处理连接时出错: {e}")
+            with self._lock:
+                if not self._queue:
+                    self._active -= 1
+                    return
+                client_socket, client_address = self._queue.popleft()
+
+    def stats(self):
+        with self._lock:
+            return {'active': self._active, 'queued': len(self._queue),
+                    'max_active': self.max_active, 'max_queued': self.max_queued}
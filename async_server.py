@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import asyncio
+from datetime import datetime
+
+from listener import create_listener, default_backlog
+from metrics import metrics
+from admission import SERVICE_UNAVAILABLE
+from deadlines import Timeouts, REQUEST_TIMEOUT, discard_output
+from http_parser import RequestParser, HTTPParseError, build_error_response
+from vectored import FileRegion, close_regions
+
+# 拒绝连接时最多等多久读掉客户端已经发出的请求（秒）
+SHED_DRAIN_TIMEOUT = 1
+
+class AsyncHTTPServer:
+    """基于 asyncio 的HTTP服务器，单个事件循环处理所有连接
+
+    连接各阶段的期限（见 deadlines.Timeouts）用事件循环的定时器检查：
+    每次读取的超时是当前阶段剩下的时间，而不是固定值。打开的连接数
+    达到 max_connections 时，新连接直接收到预先编码的503并被关闭。
+    """
+
+    def __init__(self, build_response, timeouts=None, max_requests=100, max_connections=None):
+        self.build_response = build_response
+        self.timeouts = timeouts or Timeouts()
+        self.max_requests = max_requests
+        self.max_connections = max_connections
+        self.connections = 0
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接上的所有请求"""
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else "unknown"
+        if self.max_connections is not None and self.connections >= self.max_connections:
+            # 过载时不解析请求：写出503并发送FIN，再读掉已经发来的请求，
+            # 否则关闭时socket里有未读数据，内核发送RST，客户端可能读不到503
+            metrics.connection_shed(client_ip)
+            writer.write(SERVICE_UNAVAILABLE)
+            try:
+                writer.write_eof()
+                await writer.drain()
+                await asyncio.wait_for(reader.read(65536), SHED_DRAIN_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                pass
+            writer.close()
+            return
+        parser = RequestParser()
+        served = 0
+        keep_open = True
+        loop = asyncio.get_running_loop()
+        phase = 'header'
+        expires = loop.time() + self.timeouts.header
+        self.connections += 1
+        metrics.connection_opened(client_ip)
+        try:
+            while keep_open:
+                try:
+                    data = await asyncio.wait_for(reader.read(65536), max(expires - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    metrics.connection_reaped(phase)
+                    if phase != 'idle':
+                        writer.write(REQUEST_TIMEOUT)
+                    break
+                if not data:
+                    break
+
+                try:
+                    requests = parser.feed(data)
+                except HTTPParseError as e:
+                    writer.write(build_error_response(e.status))
+                    await writer.drain()
+                    break
+
+                if requests:
+                    try:
+                        keep_open = await asyncio.wait_for(
+                            self.respond(writer, requests, client_ip, served), self.timeouts.write)
+                    except asyncio.TimeoutError:
+                        # 不再等读得很慢的客户端，丢弃缓冲区里的数据
+                        metrics.connection_reaped('write')
+                        discard_output(writer.get_extra_info('socket'))
+                        writer.transport.abort()
+                        break
+                    served += len(requests)
+                    if keep_open and parser.error is not None:
+                        # 同一批数据里格式错误的请求：前面的请求已经响应，再回复错误
+                        writer.write(build_error_response(parser.error.status))
+                        await writer.drain()
+                        break
+
+                # 阶段变化（或处理完请求回到空闲）时重新计算期限
+                if requests or parser.phase != phase:
+                    phase = parser.phase
+                    expires = loop.time() + getattr(self.timeouts, phase)
+
+        except ConnectionError:
+            pass
+        except Exception as e:
+            print(f"处理请求时出错: {e}")
+            try:
+                writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+            except:
+                pass
+        finally:
+            self.connections -= 1
+            metrics.connection_closed(client_ip)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except:
+                pass
+
+    async def respond(self, writer, requests, client_ip, served):
+        """按顺序写出一批管线化请求的响应，返回连接是否继续保持"""
+        for request in requests:
+            served += 1
+            keep_alive = request.keep_alive and served < self.max_requests
+            request.client_ip = client_ip
+            await self.write_parts(writer, self.build_response(request, keep_alive))
+            if request.upgrade is not None:
+                # 响应头写完后把连接交给事件流/WebSocket：先停止读取，
+                # 交出一份socket，传输层随后只关闭自己那份描述符
+                await writer.drain()
+                writer.transport.pause_reading()
+                request.upgrade(writer.get_extra_info('socket'))
+                return False
+            if not keep_alive:
+                await writer.drain()
+                return False
+        await writer.drain()
+        return True
+
+    async def write_parts(self, writer, parts):
+        """写出 build_response 返回的字节段列表
+
+        内存中的段交给 writelines（Python 3.12+ 的传输层用 sendmsg 写出），
+        文件段先等缓冲区写空，再用 loop.sendfile 在内核里拷贝。
+        """
+        pending = []
+        try:
+            for part in parts:
+                if isinstance(part, FileRegion):
+                    writer.writelines(pending)
+                    pending = []
+                    await writer.drain()
+                    await asyncio.get_running_loop().sendfile(writer.transport, part.file, part.offset, part.count)
+                    part.close()
+                else:
+                    pending.append(part)
+            writer.writelines(pending)
+        finally:
+            close_regions(parts)
+
+    async def serve(self, host, port, backlog=None, server_socket=None, reuse_port=False):
+        """在指定地址上运行服务器直到被取消"""
+        if backlog is None:
+            backlog = default_backlog()
+        if server_socket is None:
+            server_socket = create_listener(host, port, backlog, reuse_port=reuse_port)
+        server_socket.setblocking(False)
+        # asyncio 会对传入的socket再次调用 listen()，这里要把队列长度传下去
+        server = await asyncio.start_server(self.handle_connection, sock=server_socket,
+                                            backlog=backlog)
+        print("asyncio 模式: 单个事件循环处理所有连接")
+        async with server:
+            await server.serve_forever()
+
+def run_server(host, port, build_response, timeouts=None, max_requests=100,
+               server_socket=None, reuse_port=False, backlog=None, max_connections=None):
+    """启动 asyncio 服务器（阻塞直到 Ctrl+C）"""
+    if ':' in host:
+        print(f"启动IPv6服务器在 [{host}]:{port}")
+    else:
+        print(f"启动IPv4服务器在 {host}:{port}")
+    app = AsyncHTTPServer(build_response, timeouts, max_requests, max_connections)
+    print(f"服务器启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("按 Ctrl+C 停止服务器")
+    try:
+        asyncio.run(app.serve(host, port, backlog, server_socket=server_socket, reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("\n服务器已停止")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import base64
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from http_parser import HTTPRequest
+from json_response import JSON_TYPE, dump_json
+from routes import Response
+from vectored import FileRegion, close_regions
+
+# 一个批量请求最多包含的子请求数
+MAX_BATCH_REQUESTS = 20
+# 所有子响应内联进批量响应的总字节数上限
+MAX_BATCH_RESPONSE = 4 * 1024 * 1024
+# 并行执行子请求的线程数
+BATCH_WORKERS = 4
+
+# 不传给子请求的头：请求体相关的头由子请求自己决定，子响应不压缩
+SKIPPED_HEADERS = ('content-length', 'content-type', 'transfer-encoding', 'expect', 'accept-encoding',
+                   'if-none-match', 'if-modified-since', 'range')
+
+class Batch:
+    """/api/batch：一次请求执行多个子请求
+
+    请求体是 {"requests": [{"method": "GET", "path": "/api/hello", "body": ...}, ...],
+    "parallel": false}（也可以直接是子请求列表）。子请求在进程内交给同一个
+    路由表的处理函数，不经过网络和HTTP解析；parallel 为真时在一个小线程池
+    里并行执行。子请求继承外层请求的头和客户端地址，body 为字符串时原样
+    作为请求体，其他JSON值序列化后作为 application/json 请求体。
+
+    响应按顺序返回每个子请求的 status、content_type 和 body：JSON 响应体
+    直接拼进结果（不重新解析），文本作为字符串，其他内容用 base64。
+    子请求数超过 max_requests 时整个批量请求返回413，内联的响应体超过
+    max_response 后其余子请求返回413；流式响应（事件流、WebSocket 等）
+    返回400。
+    """
+
+    def __init__(self, router, max_requests=MAX_BATCH_REQUESTS, max_response=MAX_BATCH_RESPONSE,
+                 workers=BATCH_WORKERS):
+        self.router = router
+        self.max_requests = max_requests
+        self.max_response = max_response
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __call__(self, request):
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            return _error(400, 'Invalid JSON')
+        parallel = False
+        if isinstance(data, dict):
+            parallel = bool(data.get('parallel', False))
+            data = data.get('requests')
+        if not isinstance(data, list):
+            return _error(400, 'Expected a list of requests')
+        if len(data) > self.max_requests:
+            return _error(413, f'Too many requests (max {self.max_requests})')
+
+        # 每个子请求读取响应体之前先从预算里扣除，内存里最多只有 max_response 字节的子响应
+        budget = _Budget(self.max_response)
+        if parallel and len(data) > 1:
+            results = list(self._pool().map(lambda item: self._run(request, item, budget), data))
+        else:
+            results = [self._run(request, item, budget) for item in data]
+
+        parts = [b'{"responses": [']
+        for i, (status, content_type, body) in enumerate(results):
+            if i:
+                parts.append(b', ')
+            parts.append(b'{"status": %d, "content_type": ' % status)
+            parts.append(dump_json(content_type))
+            parts.append(b', "body": ')
+            parts.extend(body)
+            parts.append(b'}')
+        parts.append(b']}')
+        return Response(200, parts, JSON_TYPE)
+
+    def _pool(self):
+        # 第一次用到时才创建（预派生模式下在子进程里创建）
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='batch')
+            return self._executor
+
+    def _run(self, parent, item, budget):
+        """执行一个子请求，返回 (status, content_type, JSON片段列表)
+
+        预算用完后不再执行后面的子请求；放不进剩余预算的响应体不读取。
+        """
+        if budget.remaining <= 0:
+            return _result(413, 'Batch response too large')
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str) \
+                or not item['path'].startswith('/'):
+            return _result(400, 'Each request needs an absolute "path"')
+        method = str(item.get('method', 'GET')).upper()
+        headers = {name: value for name, value in parent.headers.items() if name not in SKIPPED_HEADERS}
+        body = item.get('body')
+        if body is None:
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        else:
+            body = dump_json(body)
+            headers['content-type'] = 'application/json'
+        extra = item.get('headers')
+        if isinstance(extra, dict):
+            headers.update((str(name).lower(), str(value)) for name, value in extra.items())
+        headers['content-length'] = str(len(body))
+
+        handler, params = self.router.resolve(method, item['path'])
+        if handler is self:
+            return _result(400, 'Nested batch requests are not allowed')
+        if handler is None:
+            handler = self.router.not_found
+        if handler is None:
+            return _result(404, 'Not Found')
+        request = HTTPRequest(method, item['path'], 'HTTP/1.1', headers, body, parent.client_ip)
+        request.params = params
+        try:
+            response = self.router.call(handler, request)
+        except Exception as e:
+            print(f"批量请求中的子请求出错: {e}")
+            return _result(500, 'Internal Server Error')
+        if response.chunks is not None or request.upgrade is not None:
+            # 事件流、WebSocket 等响应没有完整的响应体，不能当作成功内联
+            return _result(400, 'Streaming responses cannot be batched')
+        length = response.length
+        if not budget.take(length):
+            # 不读取放不进批量响应的内容（例如 sendfile 发送的大文件）
+            close_regions(response.body_parts())
+            return _result(413, 'Batch response too large')
+        body = _inline(response)
+        # 转义、base64 后的长度和原始长度不同，按实际内联的长度结算
+        if not budget.take(sum(len(part) for part in body) - length):
+            budget.take(-length)
+            return _result(413, 'Batch response too large')
+        return response.status, response.content_type, body
+
+class _Budget:
+    """批量响应剩余的字节数，并行执行的子请求共享"""
+
+    def __init__(self, size):
+        self.remaining = size
+        self._lock = threading.Lock()
+
+    def take(self, size):
+        """扣除 size 字节（负数为退还），剩余不够时不扣除并返回 False"""
+        with self._lock:
+            if size > self.remaining:
+                return False
+            self.remaining -= size
+            return True
+
+def _inline(response):
+    """把子响应体转换成JSON片段"""
+    parts = response.body_parts()
+    try:
+        data = b''.join(os.pread(part.file.fileno(), part.count, part.offset) if isinstance(part, FileRegion)
+                        else bytes(part) for part in parts)
+    finally:
+        close_regions(parts)
+    content_type = response.content_type.split(';', 1)[0].strip().lower()
+    if content_type == 'application/json' or content_type.endswith('+json'):
+        return [data or b'null']
+    if content_type.startswith('text/') or content_type.endswith(('/javascript', '/xml')):
+        return [dump_json(data.decode('utf-8', 'replace'))]
+    return [b'{"base64": "', base64.b64encode(data), b'"}']
+
+def _result(status, message):
+    return status, JSON_TYPE, [dump_json({'error': message})]
+
+def _error(status, message):
+    return Response(status, dump_json({'error': message}), JSON_TYPE)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""JSON 响应生成的微基准：对比逐次序列化/拼接与预序列化快速路径
+
+运行：python3 bench/json_bench.py [--number 200000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caching import CachePolicy, apply_cache_policy
+from clock import clock
+from compression import compress_response
+from json_response import ConstantJSON, JSON_TYPE
+from routes import Response, status_line
+from templates import JSONTemplate
+
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+]
+STATUS_DATA = {'server': 'Python HTTP Server', 'status': 'running', 'version': '1.0.0'}
+STATUS_RESPONSE = ConstantJSON(STATUS_DATA, headers=CORS_HEADERS, cache=CachePolicy(max_age=60))
+CLIENT_IP = '2001:db8::1'
+
+def constant_dumps():
+    """原来的做法：每次 json.dumps，并像 send_header 那样逐行编码响应头"""
+    body = json.dumps(STATUS_DATA, ensure_ascii=False).encode('utf-8')
+    buffer = [status_line(200).encode('latin-1')]
+    for name, value in [('Server', 'BaseHTTP/0.6'), ('Date', clock.http_date()),
+                        ('Content-type', JSON_TYPE), ('Content-Length', str(len(body)))] + CORS_HEADERS:
+        buffer.append(f"{name}: {value}\r\n".encode('latin-1', 'strict'))
+    buffer.append(b"\r\n")
+    return b''.join(buffer), body
+
+def constant_prepared():
+    """快速路径：响应体和固定头在启动时生成，只追加 Date 等动态头，一次写出"""
+    response = STATUS_RESPONSE.response()
+    compress_response(response, 'gzip', 1024)
+    apply_cache_policy(response, 'GET', None)
+    tail = f"Server: BaseHTTP/0.6\r\nDate: {clock.http_date()}\r\n\r\n"
+    return b''.join((response.head_bytes(), tail.encode('latin-1'), response.body))
+
+TIME_JSON = JSONTemplate('{"time": "{{time}}", "client_ip": "{{client_ip}}", "timestamp": {{timestamp|raw}}}')
+
+def templated_concat():
+    """原来 socket 服务器的做法：字符串拼接（不转义）"""
+    timestamp, current_time = clock.now()
+    content = '{"time": "' + current_time + '", "client_ip": "' + CLIENT_IP + '", "timestamp": ' + str(timestamp) + '}'
+    return content.encode('utf-8')
+
+def templated_dumps():
+    """正确转义的朴素做法：每次 json.dumps 整个字典"""
+    timestamp, current_time = clock.now()
+    return json.dumps({'time': current_time, 'client_ip': CLIENT_IP, 'timestamp': timestamp},
+                      ensure_ascii=False).encode('utf-8')
+
+def templated_splice():
+    """JSONTemplate：只转义动态值，拼进预先编码的片段"""
+    timestamp, current_time = clock.now()
+    return TIME_JSON.render(time=current_time, client_ip=CLIENT_IP, timestamp=timestamp)
+
+def templated_response():
+    """socket 服务器完整的响应生成：模板 + 预生成状态行和头"""
+    response = Response(200, templated_splice(), JSON_TYPE)
+    compress_response(response, 'gzip', 1024)
+    tail = f"Connection: keep-alive\r\nDate: {clock.http_date()}\r\nServer: Python-Simple-Server\r\n\r\n"
+    return response.head_bytes() + tail.encode('utf-8') + response.body
+
+CASES = [
+    ('常量: json.dumps + 逐行头', constant_dumps),
+    ('常量: 预序列化 + 一次写出', constant_prepared),
+    ('模板: 字符串拼接(不转义)', templated_concat),
+    ('模板: json.dumps', templated_dumps),
+    ('模板: JSONTemplate', templated_splice),
+    ('模板: 完整响应', templated_response),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 响应生成微基准')
+    parser.add_argument('--number', type=int, default=200000, help='每项重复次数')
+    parser.add_argument('--repeat', type=int, default=3, help='取最好成绩的轮数')
+    args = parser.parse_args()
+    for name, func in CASES:
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        print(f"{name:<28} {best / args.number * 1e6:8.3f} µs/次")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""多进程HTTP负载生成器
+
+每个进程运行一个 selectors 事件循环，持有若干个非阻塞连接：
+closed 模式下每个连接收到响应后立即发下一个请求（并发数固定）；
+open 模式下按固定速率安排请求，延迟从计划发送时间算起，服务器变慢时
+不会因为客户端等待而少发请求（避免协调遗漏）。
+"""
+import collections
+import errno
+import multiprocessing
+import re
+import selectors
+import socket
+import time
+
+CONTENT_LENGTH = re.compile(rb'\r\ncontent-length:\s*(\d+)', re.IGNORECASE)
+CONNECTION_CLOSE = re.compile(rb'\r\nconnection:\s*close', re.IGNORECASE)
+
+def build_request(host, path, keep_alive):
+    connection = 'keep-alive' if keep_alive else 'close'
+    return (f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: py-demo-bench\r\n"
+            f"Accept-Encoding: gzip\r\nConnection: {connection}\r\n\r\n").encode('latin-1')
+
+def parse_response(buffer):
+    """检查缓冲区里是否有一个完整的响应
+
+    返回 None（还不完整），或 (状态码, 响应总长度, 服务器是否要求关闭连接)；
+    没有 Content-Length 的响应总长度为 -1，读到连接关闭为止。
+    """
+    head_end = buffer.find(b'\r\n\r\n')
+    if head_end < 0:
+        return None
+    head = bytes(buffer[:head_end])
+    try:
+        status = int(head[9:12])
+    except ValueError:
+        status = 0
+    match = CONTENT_LENGTH.search(head)
+    if status in (204, 304):
+        length = head_end + 4
+    elif match is None:
+        return status, -1, True
+    else:
+        length = head_end + 4 + int(match.group(1))
+    if len(buffer) < length:
+        return None
+    return status, length, bool(CONNECTION_CLOSE.search(head))
+
+class _Connection:
+    __slots__ = ('sock', 'connected', 'output', 'input', 'scheduled', 'busy')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.connected = False
+        self.output = b''
+        self.input = bytearray()
+        self.scheduled = None
+        self.busy = False
+
+class Worker:
+    """一个进程中的负载循环"""
+
+    def __init__(self, address, path, mode='closed', keep_alive=True, connections=8,
+                 rate=0.0, timeout=5.0):
+        self.address = address
+        self.family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+        host = f'[{address[0]}]' if self.family == socket.AF_INET6 else address[0]
+        self.request = build_request(f'{host}:{address[1]}', path, keep_alive)
+        self.mode = mode
+        self.keep_alive = keep_alive
+        self.max_connections = connections
+        self.rate = rate
+        self.timeout = timeout
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.idle = []
+        self.pending = collections.deque()
+        self.latencies = []
+        self.errors = collections.Counter()
+        self.statuses = collections.Counter()
+        self.received = 0
+        self.deadline = None
+
+    def run(self, start_at, duration):
+        """运行到 start_at + duration，再等待未完成的请求最多 timeout 秒"""
+        while time.monotonic() < start_at:
+            time.sleep(min(0.01, max(start_at - time.monotonic(), 0)))
+        deadline = self.deadline = start_at + duration
+        scheduled_count = 0
+        next_send = start_at
+        interval = 1.0 / self.rate if self.mode == 'open' else None
+        if self.mode == 'closed':
+            for _ in range(self.max_connections):
+                self._dispatch(time.monotonic())
+
+        while True:
+            now = time.monotonic()
+            if now >= deadline + self.timeout:
+                break
+            if interval is not None:
+                while next_send <= now and next_send < deadline:
+                    self.pending.append(next_send)
+                    scheduled_count += 1
+                    # 按序号计算，避免累加误差
+                    next_send = start_at + scheduled_count * interval
+                while self.pending and (self.idle or len(self.connections) < self.max_connections):
+                    self._dispatch(self.pending.popleft())
+            elif not self.connections and now >= deadline:
+                break
+            if now >= deadline and not any(conn.busy for conn in self.connections) and not self.pending:
+                break
+
+            wait = 0.05 if interval is None else max(min(next_send - now, 0.05), 0)
+            for key, events in self.selector.select(wait):
+                conn = key.data
+                if events & selectors.EVENT_WRITE:
+                    self._on_writable(conn)
+                if events & selectors.EVENT_READ and conn.sock.fileno() != -1:
+                    self._on_readable(conn, deadline)
+            self._expire(time.monotonic())
+
+        # 计划了但来不及发出或没有完成的请求都算超时
+        unfinished = len(self.pending) + sum(1 for conn in self.connections if conn.busy)
+        if unfinished:
+            self.errors['timeout'] += unfinished
+        for conn in list(self.connections):
+            self._close(conn)
+        self.selector.close()
+        return {
+            'latencies': self.latencies,
+            'errors': dict(self.errors),
+            'statuses': dict(self.statuses),
+            'bytes': self.received,
+        }
+
+    def _dispatch(self, scheduled):
+        """把一个请求交给空闲连接，没有空闲连接时新建一个"""
+        if self.idle:
+            conn = self.idle.pop()
+            conn.output = self.request
+            conn.scheduled = scheduled
+            conn.busy = True
+            self.selector.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+            return
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = _Connection(sock)
+        conn.output = self.request
+        conn.scheduled = scheduled
+        conn.busy = True
+        code = sock.connect_ex(self.address)
+        if code not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            self.errors['connect'] += 1
+            return
+        self.connections.add(conn)
+        self.selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+
+    def _on_writable(self, conn):
+        if not conn.connected:
+            code = conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if code:
+                self._fail(conn, 'connect')
+                return
+            conn.connected = True
+        try:
+            sent = conn.sock.send(conn.output)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._fail(conn, 'send')
+            return
+        conn.output = conn.output[sent:]
+        if not conn.output:
+            self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+
+    def _on_readable(self, conn, deadline):
+        try:
+            data = conn.sock.recv(262144)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._fail(conn, 'recv')
+            return
+        if data:
+            conn.input += data
+            parsed = parse_response(conn.input)
+            if parsed is None or parsed[1] == -1:
+                return
+        else:
+            parsed = parse_response(conn.input) if conn.input else None
+            if parsed is None:
+                if conn.busy:
+                    self._fail(conn, 'closed')
+                else:
+                    self._close(conn)
+                return
+            parsed = (parsed[0], len(conn.input), True)
+
+        status, length, server_closes = parsed
+        now = time.monotonic()
+        self.latencies.append(now - conn.scheduled)
+        self.statuses[status] += 1
+        self.received += length
+        if status >= 400 or status < 100:
+            self.errors[f'status_{status}'] += 1
+        del conn.input[:length]
+        conn.busy = False
+
+        reuse = self.keep_alive and not server_closes
+        if not reuse:
+            self._close(conn)
+        if self.mode == 'closed':
+            if now < deadline:
+                if reuse:
+                    self.idle.append(conn)
+                self._dispatch(now)
+            elif reuse:
+                self._close(conn)
+        elif reuse:
+            self.idle.append(conn)
+
+    def _expire(self, now):
+        for conn in list(self.connections):
+            if conn.busy and now - conn.scheduled > self.timeout:
+                self._fail(conn, 'timeout')
+
+    def _fail(self, conn, reason):
+        self.errors[reason] += 1
+        conn.busy = False
+        self._close(conn)
+        if self.mode == 'closed':
+            # 保持并发数不变：失败的连接由新连接替换
+            now = time.monotonic()
+            if now < self.deadline:
+                self._dispatch(now)
+
+    def _close(self, conn):
+        if conn in self.idle:
+            self.idle.remove(conn)
+        if conn in self.connections:
+            self.connections.discard(conn)
+            try:
+                self.selector.unregister(conn.sock)
+            except (KeyError, ValueError):
+                pass
+        conn.sock.close()
+
+def _worker_main(options, start_at, duration, results):
+    results.put(Worker(**options).run(start_at, duration))
+
+def percentile(sorted_values, fraction):
+    """最近秩法求分位数"""
+    if not sorted_values:
+        return None
+    index = max(int(fraction * len(sorted_values) + 0.999999) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def run_load(address, path, mode='closed', keep_alive=True, processes=2, connections=8,
+             rate=1000.0, duration=5.0, timeout=5.0):
+    """用多个进程施加负载，返回汇总后的结果
+
+    connections 是每个进程的连接数上限；open 模式下 rate 是所有进程合计的
+    每秒请求数。
+    """
+    results = multiprocessing.Queue()
+    options = {
+        'address': address, 'path': path, 'mode': mode, 'keep_alive': keep_alive,
+        'connections': connections, 'rate': rate / processes, 'timeout': timeout,
+    }
+    # 所有进程在同一时刻开始，避免先启动的进程独占服务器
+    start_at = time.monotonic() + 0.5
+    workers = [multiprocessing.Process(target=_worker_main, args=(options, start_at, duration, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    parts = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = sorted(latency for part in parts for latency in part['latencies'])
+    errors = collections.Counter()
+    statuses = collections.Counter()
+    for part in parts:
+        errors.update(part['errors'])
+        statuses.update(part['statuses'])
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'mode': mode,
+        'keep_alive': keep_alive,
+        'processes': processes,
+        'connections_per_process': connections,
+        'target_rate': rate if mode == 'open' else None,
+        'duration': duration,
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'bytes': sum(part['bytes'] for part in parts),
+        'errors': sum(errors.values()),
+        'error_kinds': dict(errors),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.50)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'p99.9': ms(percentile(latencies, 0.999)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+    }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""端到端负载基准：在回环地址上启动各个服务器，按路由、地址族、
+负载模式和 keep-alive 组合施压，把吞吐、延迟分位数、错误数和服务器
+内存写成 JSON。
+
+运行：python3 bench/run_bench.py --duration 5 --output results.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import run_load
+from servers import SERVERS, ServerProcess
+
+FAMILIES = {'v4': '127.0.0.1', 'v6': '::1'}
+DEFAULT_ROUTES = ['/', '/api/hello', '/api/time', '/api/status']
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP 服务器端到端负载基准')
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS), help='被测服务器')
+    parser.add_argument('--families', nargs='+', choices=list(FAMILIES), default=list(FAMILIES),
+                        help='地址族：v4 为 127.0.0.1，v6 为 ::1')
+    parser.add_argument('--routes', nargs='+', default=DEFAULT_ROUTES, help='请求的路径')
+    parser.add_argument('--modes', nargs='+', choices=['closed', 'open'], default=['closed', 'open'],
+                        help='closed：固定并发；open：固定到达速率')
+    parser.add_argument('--keepalive', nargs='+', choices=['on', 'off'], default=['on', 'off'],
+                        help='是否复用连接')
+    parser.add_argument('--duration', type=float, default=5.0, help='每个组合的施压秒数')
+    parser.add_argument('--processes', type=int, default=2, help='负载生成进程数')
+    parser.add_argument('--connections', type=int, default=8, help='每个进程的连接数（open 模式下为上限）')
+    parser.add_argument('--rate', type=float, default=1000.0, help='open 模式下合计的每秒请求数')
+    parser.add_argument('--timeout', type=float, default=5.0, help='单个请求的超时秒数，超时计为错误')
+    parser.add_argument('--output', default=None, help='结果 JSON 文件，默认输出到标准输出')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'started': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'duration': args.duration,
+            'processes': args.processes,
+            'connections': args.connections,
+            'rate': args.rate,
+        },
+        'results': [],
+    }
+
+    for name in args.servers:
+        for family in args.families:
+            host = FAMILIES[family]
+            # 每个服务器/地址族单独启动一次，内存数据反映这一组负载后的状态
+            with ServerProcess(name, host) as server:
+                for route in args.routes:
+                    for mode in args.modes:
+                        for keep_alive in args.keepalive:
+                            result = run_load((host, server.port), route, mode=mode,
+                                              keep_alive=keep_alive == 'on', processes=args.processes,
+                                              connections=args.connections, rate=args.rate,
+                                              duration=args.duration, timeout=args.timeout)
+                            result = {'server': name, 'family': family, 'route': route, **result,
+                                      'server_memory': server.memory()}
+                            report['results'].append(result)
+                            latency = result['latency_ms']
+                            print(f"{name:<17} {family} {route:<12} {mode:<6} keepalive={keep_alive:<3} "
+                                  f"{result['throughput_rps']:>9.1f} 请求/秒  p50={latency['p50']}ms "
+                                  f"p99={latency['p99']}ms p99.9={latency['p99.9']}ms "
+                                  f"错误={result['errors']}", file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('fork' if hasattr(os, 'fork') else 'spawn')
+    main()
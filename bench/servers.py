@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""在子进程中启动被测服务器，监听回环地址上的临时端口"""
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 被测服务器名称 -> 说明
+SERVERS = {
+    'server': 'server.run_server（http.server，每连接一个线程）',
+    'ipv6server': 'ipv6server.start_server（批量accept + 每连接一个线程）',
+    'dual_port_server': 'dual_port_server.start_server（selectors 事件循环）',
+}
+
+def free_port(host):
+    """向内核要一个当前空闲的临时端口"""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+def _quiet():
+    # 服务器的启动信息和访问日志不输出到终端
+    devnull = open(os.devnull, 'w')
+    sys.stdout = devnull
+    sys.stderr = devnull
+
+def _run(name, host, port, port_pipe):
+    _quiet()
+    if name == 'server':
+        import server
+        # run_server 绑定 '::'（双栈），回环的 IPv4/IPv6 都能连上
+        port_pipe.send(port)
+        server.run_server(port)
+    elif name == 'ipv6server':
+        import ipv6server
+        from listener import create_listener
+        server_socket = create_listener(host, 0)
+        port_pipe.send(server_socket.getsockname()[1])
+        ipv6server.start_server(host, server_socket.getsockname()[1], server_socket=server_socket)
+    elif name == 'dual_port_server':
+        import dual_port_server
+        port_pipe.send(port)
+        dual_port_server.start_server(host, port)
+    else:
+        raise ValueError(f"未知的服务器: {name}")
+
+def wait_ready(host, port, timeout=10.0):
+    """等到服务器可以接受连接"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+class ServerProcess:
+    """在子进程中运行的被测服务器"""
+
+    def __init__(self, name, host):
+        if name not in SERVERS:
+            raise ValueError(f"未知的服务器: {name}")
+        self.name = name
+        self.host = host
+        self.port = None
+        self.process = None
+
+    def start(self):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        port = free_port(self.host)
+        self.process = multiprocessing.Process(target=_run, args=(self.name, self.host, port, sender),
+                                               daemon=True)
+        self.process.start()
+        if not receiver.poll(10):
+            self.stop()
+            raise RuntimeError(f"{self.name} 启动超时")
+        self.port = receiver.recv()
+        wait_ready(self.host, self.port)
+        return self
+
+    def memory(self):
+        """服务器进程当前和峰值的常驻内存（KB），非 Linux 系统返回 None"""
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            return None
+        return {
+            'rss_kb': int(fields['VmRSS'].split()[0]),
+            'peak_rss_kb': int(fields['VmHWM'].split()[0]),
+        }
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
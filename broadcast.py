@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+import collections
+import os
+import selectors
+import socket
+import threading
+import time
+
+from metrics import metrics
+
+# 每个订阅者最多积压的未发送字节数
+MAX_BACKLOG = 64 * 1024
+
+def detach_socket(sock):
+    """接管连接：返回拥有这个连接的新socket对象
+
+    原来的对象交出文件描述符后再关闭也不会断开连接；asyncio 的
+    TransportSocket 不能交出描述符，复制一份，传输层随后关闭自己那份。
+    """
+    if hasattr(sock, 'detach'):
+        return socket.socket(fileno=sock.detach())
+    return socket.socket(fileno=os.dup(sock.fileno()))
+
+class Subscriber:
+    """一个订阅连接
+
+    pending 是待发送的 (channel, 数据) 队列，第一项可能已经发出 offset 字节；
+    size 是队列中还没发出的字节数。on_data 处理客户端发来的数据（例如
+    WebSocket 帧），为空时读到的数据直接丢弃，只用来发现连接关闭。
+    """
+    __slots__ = ('sock', 'channels', 'pending', 'offset', 'size', 'on_data', 'on_close', 'state')
+
+    def __init__(self, sock, channels, on_data=None, on_close=None, state=None):
+        self.sock = sock
+        self.channels = channels
+        self.pending = collections.deque()
+        self.offset = 0
+        self.size = 0
+        self.on_data = on_data
+        self.on_close = on_close
+        # 协议自己的状态（例如 WebSocket 的帧解析器）
+        self.state = state
+
+class Channel:
+    """一个事件流：订阅者集合、最近一次事件和生成事件的函数
+
+    produce() 每 interval 秒在事件循环线程里调用一次（没有订阅者时不调用），
+    返回编码好的字节，同一份字节写给所有订阅者。coalesce 为真时只有最新的
+    事件有意义，慢订阅者积压的旧事件可以直接丢弃。
+    """
+    __slots__ = ('name', 'subscribers', 'last', 'interval', 'produce', 'coalesce', 'next_at')
+
+    def __init__(self, name, interval=None, produce=None, coalesce=True):
+        self.name = name
+        self.subscribers = set()
+        self.last = None
+        self.interval = interval
+        self.produce = produce
+        self.coalesce = coalesce
+        self.next_at = None
+
+class Hub:
+    """订阅连接的事件循环
+
+    所有订阅者（SSE、WebSocket）都放在一个后台线程的 selectors 循环里，
+    不为每个订阅者占用线程。每个事件只编码一次，同一份字节写给所有
+    订阅者；写不进内核的部分排队，积压超过 max_backlog 时先丢弃同一频道
+    的旧事件（coalesce），仍然超过就断开这个订阅者。其他线程通过
+    subscribe()/publish() 投递，由 socketpair 唤醒事件循环。
+    """
+
+    def __init__(self, max_backlog=MAX_BACKLOG):
+        self.max_backlog = max_backlog
+        self.channels = {}
+        self.subscribers = set()
+        self.dropped = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inbox = collections.deque()
+        self._selector = None
+        self._wakeup = None
+        self._thread = None
+        metrics.add_gauge('stream_subscribers', '事件流订阅者数', lambda: len(self.subscribers))
+        metrics.add_gauge('stream_dropped', '积压过多被断开的订阅者数', lambda: self.dropped)
+        metrics.add_gauge('stream_coalesced', '慢订阅者被丢弃的旧事件数', lambda: self.coalesced)
+
+    def add_channel(self, name, interval=None, produce=None, coalesce=True):
+        """注册频道，interval/produce 为空的频道只通过 publish() 发送"""
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = Channel(name, interval, produce, coalesce)
+            metrics.add_gauge(f'stream_subscribers_{name}', f'{name} 频道的订阅者数',
+                              lambda: len(channel.subscribers))
+        return channel
+
+    def subscribe(self, sock, channels, initial=(), on_data=None, on_close=None, state=None):
+        """把已经发完响应头的连接交给事件循环（任意线程调用）
+
+        initial 是先发给这个订阅者的数据（例如握手之后的第一条事件），
+        channel 的 last 不为空时也会马上发出，不用等下一次事件。state 在
+        投递前设置好，事件循环收到数据时 on_data 就能用到。
+        """
+        self._start()
+        subscriber = Subscriber(sock, channels, on_data, on_close, state)
+        self._post(('subscribe', subscriber, initial))
+        return subscriber
+
+    def publish(self, name, data):
+        """向频道的所有订阅者发送一条编码好的事件（任意线程调用）"""
+        self._post(('publish', name, data))
+
+    def send(self, subscriber, data):
+        """只发给一个订阅者（任意线程调用），不参与合并"""
+        if threading.current_thread() is self._thread:
+            if subscriber in self.subscribers:
+                self._write(subscriber, None, data)
+            return
+        self._post(('send', subscriber, data))
+
+    def close(self, subscriber):
+        """发完已经排队的数据后断开（任意线程调用）"""
+        if threading.current_thread() is self._thread:
+            if subscriber in self.subscribers:
+                self._write(subscriber, None, b'', close=True)
+            return
+        self._post(('close', subscriber, None))
+
+    def stats(self):
+        return {
+            'subscribers': len(self.subscribers),
+            'channels': {name: len(channel.subscribers) for name, channel in self.channels.items()},
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
+
+    def _start(self):
+        # 第一次有订阅者时才启动（预派生模式下在子进程里启动）
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._selector = selectors.DefaultSelector()
+            reader, self._wakeup = socket.socketpair()
+            reader.setblocking(False)
+            self._wakeup.setblocking(False)
+            self._selector.register(reader, selectors.EVENT_READ, None)
+            self._thread = threading.Thread(target=self._run, name='stream-hub', daemon=True)
+            self._thread.start()
+
+    def _post(self, item):
+        if self._thread is None:
+            return
+        self._inbox.append(item)
+        try:
+            self._wakeup.send(b'\0')
+        except OSError:
+            # 唤醒缓冲区满说明事件循环已经有待处理的唤醒
+            pass
+
+    def _run(self):
+        while True:
+            now = time.time()
+            timeout = None
+            for channel in self.channels.values():
+                if channel.produce is None:
+                    continue
+                if channel.next_at is None:
+                    # 对齐到 interval 的整数倍（例如每秒的开始）
+                    channel.next_at = (int(now / channel.interval) + 1) * channel.interval
+                if channel.next_at <= now:
+                    channel.next_at += channel.interval * max(1, int((now - channel.next_at) / channel.interval) + 1)
+                    if channel.subscribers:
+                        self._broadcast(channel, channel.produce())
+                    else:
+                        # 没有订阅者时不生成事件，也不保留过期的事件
+                        channel.last = None
+                wait = channel.next_at - now
+                timeout = wait if timeout is None else min(timeout, wait)
+            for key, events in self._selector.select(timeout):
+                subscriber = key.data
+                if subscriber is None:
+                    self._drain_inbox(key.fileobj)
+                    continue
+                if events & selectors.EVENT_READ:
+                    self._on_readable(subscriber)
+                if events & selectors.EVENT_WRITE and subscriber in self.subscribers:
+                    self._flush(subscriber)
+
+    def _drain_inbox(self, reader):
+        try:
+            while reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._inbox:
+            action, target, data = self._inbox.popleft()
+            if action == 'publish':
+                channel = self.channels.get(target) or self.add_channel(target)
+                self._broadcast(channel, data)
+            elif target not in self.subscribers and action != 'subscribe':
+                continue
+            elif action == 'subscribe':
+                self._add(target, data)
+            elif action == 'send':
+                self._write(target, None, data)
+            elif action == 'close':
+                self._write(target, None, b'', close=True)
+
+    def _add(self, subscriber, initial):
+        try:
+            subscriber.sock.setblocking(False)
+            self._selector.register(subscriber.sock, selectors.EVENT_READ, subscriber)
+        except (OSError, ValueError):
+            subscriber.sock.close()
+            return
+        self.subscribers.add(subscriber)
+        for name in subscriber.channels:
+            channel = self.channels.get(name) or self.add_channel(name)
+            channel.subscribers.add(subscriber)
+        for data in initial:
+            self._write(subscriber, None, data)
+        for name in subscriber.channels:
+            channel = self.channels[name]
+            if channel.last is not None and subscriber in self.subscribers:
+                self._write(subscriber, name, channel.last)
+
+    def _broadcast(self, channel, data):
+        if data is None:
+            return
+        channel.last = data
+        for subscriber in list(channel.subscribers):
+            self._write(subscriber, channel.name, data)
+
+    def _write(self, subscriber, name, data, close=False):
+        """发送或排队；积压过多时合并旧事件或断开"""
+        if close:
+            subscriber.pending.append((None, None))
+        elif subscriber.pending:
+            if subscriber.size + len(data) > self.max_backlog:
+                self._coalesce(subscriber, name)
+                if subscriber.size + len(data) > self.max_backlog:
+                    self.dropped += 1
+                    self._remove(subscriber)
+                    return
+            subscriber.pending.append((name, data))
+            subscriber.size += len(data)
+            return
+        else:
+            subscriber.pending.append((name, data))
+            subscriber.size += len(data)
+        self._flush(subscriber)
+
+    def _coalesce(self, subscriber, name):
+        """丢掉同一频道中还没开始发送的旧事件（可合并的频道才这样做）"""
+        channel = self.channels.get(name)
+        if channel is None or not channel.coalesce:
+            return
+        kept = collections.deque()
+        for i, (item_name, data) in enumerate(subscriber.pending):
+            if item_name == name and not (i == 0 and subscriber.offset):
+                subscriber.size -= len(data)
+                self.coalesced += 1
+                continue
+            kept.append((item_name, data))
+        subscriber.pending = kept
+
+    def _flush(self, subscriber):
+        pending = subscriber.pending
+        try:
+            while pending:
+                name, data = pending[0]
+                if data is None:
+                    # close() 排在这里：前面的数据都已经发出
+                    self._remove(subscriber)
+                    return
+                sent = subscriber.sock.send(memoryview(data)[subscriber.offset:])
+                subscriber.offset += sent
+                subscriber.size -= sent
+                if subscriber.offset < len(data):
+                    break
+                pending.popleft()
+                subscriber.offset = 0
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._remove(subscriber)
+            return
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if pending else selectors.EVENT_READ
+        try:
+            self._selector.modify(subscriber.sock, events, subscriber)
+        except (KeyError, ValueError, OSError):
+            self._remove(subscriber)
+
+    def _on_readable(self, subscriber):
+        try:
+            data = subscriber.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._remove(subscriber)
+            return
+        if subscriber.on_data is not None:
+            try:
+                subscriber.on_data(self, subscriber, data)
+            except Exception as e:
+                print(f"处理订阅连接的数据时出错: {e}")
+                self._remove(subscriber)
+
+    def _remove(self, subscriber):
+        if subscriber not in self.subscribers:
+            return
+        self.subscribers.discard(subscriber)
+        for name in subscriber.channels:
+            channel = self.channels.get(name)
+            if channel is not None:
+                channel.subscribers.discard(subscriber)
+        subscriber.pending.clear()
+        try:
+            self._selector.unregister(subscriber.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            subscriber.sock.close()
+        except OSError:
+            pass
+        if subscriber.on_close is not None:
+            try:
+                subscriber.on_close(subscriber)
+            except Exception:
+                pass
+
+# 所有服务器共享的订阅事件循环
+hub = Hub()
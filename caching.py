@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import hashlib
+
+# 只有这些方法的成功响应参与条件请求
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+def make_etag(body, weak=False):
+    """根据响应体计算 ETag（带引号），weak 为真时生成 W/ 前缀的弱校验值
+
+    body 可以是 bytes，也可以是字节段列表（逐段计算，不拼接）。
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for part in ([body] if isinstance(body, bytes) else body):
+        digest.update(part)
+    tag = '"' + digest.hexdigest() + '"'
+    return 'W/' + tag if weak else tag
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 是否命中（弱比较，按 RFC 7232 忽略 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+class CachePolicy:
+    """路由声明的缓存策略
+
+    max_age: Cache-Control 的 max-age（秒），None 表示不写；
+    private: 只允许浏览器缓存，不允许中间代理缓存；
+    no_cache: 可以缓存，但每次使用前都要用 ETag 重新验证；
+    no_store: 完全禁止缓存，也不生成 ETag；
+    weak: 生成弱 ETag（内容语义相同即可，例如带时间的页面）。
+    """
+    __slots__ = ('max_age', 'private', 'no_cache', 'no_store', 'weak', 'cache_control')
+
+    def __init__(self, max_age=None, private=False, no_cache=False, no_store=False, weak=False):
+        self.max_age = max_age
+        self.private = private
+        self.no_cache = no_cache
+        self.no_store = no_store
+        self.weak = weak
+        if no_store:
+            directives = ['no-store']
+        else:
+            directives = ['private' if private else 'public']
+            if max_age is not None:
+                directives.append(f'max-age={max_age}')
+            if no_cache:
+                directives.append('no-cache')
+        # Cache-Control 头在启动时生成一次
+        self.cache_control = ', '.join(directives)
+
+def apply_cache_policy(response, method, if_none_match):
+    """按 response.cache 加上 Cache-Control/ETag，命中 If-None-Match 时改成 304
+
+    需要在压缩之后调用：ETag 对应实际发送的字节，不同编码的表示有不同的 ETag。
+    处理函数可以通过 response.etag 提供预先算好的 ETag；cache 为空但带 etag
+    的响应（例如 ConstantJSON，头已经预先生成）只做条件判断。
+    """
+    policy = response.cache
+    cacheable = response.status == 200 and method in CACHEABLE_METHODS
+    if policy is not None:
+        headers = response.headers + [('Cache-Control', policy.cache_control)]
+        if policy.no_store or not cacheable:
+            response.etag = None
+        else:
+            if response.etag is None:
+                response.etag = make_etag(response.body_parts(), policy.weak)
+            headers.append(('ETag', response.etag))
+        response.headers = headers
+        response.head = None
+    if cacheable and response.etag is not None and etag_matches(if_none_match, response.etag):
+        response.status = 304
+        response.body = b''
+        response.head = None
+    return response
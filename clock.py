@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import threading
+import time
+from email.utils import formatdate
+
+class Clock:
+    """缓存的墙上时钟
+
+    每秒最多格式化一次时间字符串和HTTP Date头，请求处理时直接读取
+    缓存好的值，不再重复调用 strftime。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._second = None
+        self._snapshot = None
+        self._refresh(time.time())
+
+    def _refresh(self, now):
+        second = int(now)
+        with self._lock:
+            if second == self._second:
+                return
+            # 一次性替换整个元组，读者不需要加锁
+            self._snapshot = (
+                second,
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second)),
+                formatdate(second, usegmt=True),
+            )
+            self._second = second
+
+    def _current(self):
+        now = time.time()
+        snapshot = self._snapshot
+        if int(now) != snapshot[0]:
+            self._refresh(now)
+            snapshot = self._snapshot
+        return now, snapshot
+
+    def now_str(self):
+        """'YYYY-mm-dd HH:MM:SS' 格式的当前时间"""
+        return self._current()[1][1]
+
+    def http_date(self):
+        """HTTP Date 头格式的当前时间"""
+        return self._current()[1][2]
+
+    def timestamp(self):
+        """当前的 Unix 时间戳（浮点数）"""
+        return time.time()
+
+    def now(self):
+        """同时返回 (时间戳, 格式化时间)，保证两者属于同一秒"""
+        now, snapshot = self._current()
+        return now, snapshot[1]
+
+# 所有服务器共享的时钟
+clock = Clock()
+
+def per_second(compute):
+    """包装 compute()：同一秒内只计算一次，之后直接返回缓存的结果
+
+    用于状态摘要这类每次都要合并分片、读 /proc 的值，请求再多每秒
+    也只算一次；跨秒时几个线程同时重算一次也没有关系。
+    """
+    cached = (None, None)
+
+    def wrapper():
+        nonlocal cached
+        second = int(time.time())
+        if cached[0] != second:
+            cached = (second, compute())
+        return cached[1]
+    return wrapper
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import gzip
+import struct
+import zlib
+
+from caching import make_etag
+from vectored import FileRegion
+
+# 支持的内容编码，按优先级排列
+ENCODINGS = ('gzip', 'deflate')
+# 动态响应超过这个大小（字节）才压缩
+MIN_SIZE = 1024
+# 值得压缩的内容类型前缀
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript')
+
+# gzip 头：无文件名、mtime=0、OS=unknown
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# zlib 头（默认压缩级别）
+ZLIB_HEADER = b'\x78\x9c'
+# 结束用的空 stored 块（BFINAL=1）
+FINAL_BLOCK = b'\x01\x00\x00\xff\xff'
+
+def negotiate(accept_encoding):
+    """根据 Accept-Encoding 选择编码，返回 'gzip'、'deflate' 或 None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in ENCODINGS:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def compress(data, encoding, level=6):
+    """整体压缩一段数据"""
+    if encoding == 'gzip':
+        return gzip.compress(data, level, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    return data
+
+def deflate_segment(data, level=9):
+    """把一段静态内容压缩成独立的、以字节对齐结束的 deflate 块
+
+    使用 Z_SYNC_FLUSH 而不是 Z_FINISH，块不带结束标志，也不引用前面的
+    数据，因此可以和其他段直接拼接。
+    """
+    if not data:
+        return b''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def stored_blocks(data):
+    """把动态值包装成不压缩的 stored 块（不消耗压缩CPU）"""
+    blocks = []
+    for start in range(0, len(data), 0xffff):
+        chunk = data[start:start + 0xffff]
+        blocks.append(b'\x00' + struct.pack('<HH', len(chunk), len(chunk) ^ 0xffff) + chunk)
+    return b''.join(blocks)
+
+def wrap_deflated(encoding, plain_parts, deflated_parts):
+    """给逐段压缩好的 deflate 块加上 gzip/zlib 头尾，返回字节段列表
+
+    plain_parts 是对应的原始内容，只用于计算校验和与长度；返回的列表
+    直接引用 deflated_parts 中缓存的块，不复制。
+    """
+    if encoding == 'gzip':
+        crc = 0
+        size = 0
+        for part in plain_parts:
+            crc = zlib.crc32(part, crc)
+            size += len(part)
+        trailer = struct.pack('<II', crc, size & 0xffffffff)
+        return [GZIP_HEADER, *deflated_parts, FINAL_BLOCK, trailer]
+    adler = 1
+    for part in plain_parts:
+        adler = zlib.adler32(part, adler)
+    return [ZLIB_HEADER, *deflated_parts, FINAL_BLOCK, struct.pack('>I', adler)]
+
+def compress_response(response, accept_encoding, min_size=MIN_SIZE):
+    """按需压缩处理函数返回的 Response
+
+    已经协商过编码的响应（例如预压缩的页面，带有 Vary 头）保持不变；
+    小于 min_size 的响应永远不压缩，也就不需要 Vary。
+    """
+    if response.length < min_size or not is_compressible(response.content_type):
+        return response
+    # 部分内容和 sendfile 发送的文件不做压缩
+    if response.status == 206 or any(isinstance(part, FileRegion) for part in response.body_parts()):
+        return response
+    headers = response.headers
+    if any(name in ('Content-Encoding', 'Vary') for name, _ in headers):
+        return response
+    headers = headers + [('Vary', 'Accept-Encoding')]
+    encoding = negotiate(accept_encoding)
+    if encoding is not None:
+        response.body = compress(response.body, encoding)
+        # 预先算好的 ETag 对应未压缩的内容：响应头里已经带着的（ConstantJSON）按压缩后的
+        # 内容重新计算，否则由 apply_cache_policy 重新计算，不同编码不会共用一个 ETag
+        response.etag = None
+        for i, (name, value) in enumerate(headers):
+            if name == 'ETag':
+                response.etag = make_etag(response.body, value.startswith('W/'))
+                headers[i] = ('ETag', response.etag)
+        headers.append(('Content-Encoding', encoding))
+    response.headers = headers
+    response.head = None
+    return response
+
+def encoding_headers(encoding):
+    """预压缩内容要附带的响应头"""
+    if encoding is None:
+        return [('Vary', 'Accept-Encoding')]
+    return [('Content-Encoding', encoding), ('Vary', 'Accept-Encoding')]
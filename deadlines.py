@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import socket
+import struct
+import threading
+import time
+
+from metrics import metrics
+
+# 默认期限（秒）：收完请求头、收完请求体、写完一个响应
+HEADER_TIMEOUT = 10
+BODY_TIMEOUT = 30
+WRITE_TIMEOUT = 30
+
+# 读请求阶段超时时返回的响应（预先编码好）
+REQUEST_TIMEOUT = b"HTTP/1.1 408 Request Timeout\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+class Timeouts:
+    """连接各阶段的期限
+
+    header：从连接建立（或下一个请求的第一个字节）到收完请求头；
+    body：收完请求体；idle：keep-alive 连接两个请求之间的空闲时间；
+    write：写完一个响应。每个阶段的期限从进入该阶段时算起，
+    客户端一点一点地发数据也不会延长期限。
+    """
+    __slots__ = ('header', 'body', 'idle', 'write')
+
+    def __init__(self, header=HEADER_TIMEOUT, body=BODY_TIMEOUT, idle=15, write=WRITE_TIMEOUT):
+        self.header = header
+        self.body = body
+        self.idle = idle
+        self.write = write
+
+class Deadline:
+    """时间轮里一个连接的当前期限，data 由使用者自行保存（socket 或连接对象）"""
+    __slots__ = ('wheel', 'timeouts', 'on_expire', 'data', 'phase', 'expires', 'tick', 'expired', 'done')
+
+    def __init__(self, wheel, timeouts, on_expire, data):
+        self.wheel = wheel
+        self.timeouts = timeouts
+        self.on_expire = on_expire
+        self.data = data
+        self.phase = None
+        self.expires = float('inf')
+        self.tick = None
+        self.expired = False
+        self.done = False
+
+    def set(self, phase):
+        """进入新阶段；阶段不变时不重置期限"""
+        if phase == self.phase:
+            return
+        self.phase = phase
+        expires = time.monotonic() + getattr(self.timeouts, phase)
+        earlier = expires < self.expires
+        self.expires = expires
+        # 期限推后时不用动时间轮，到期检查时会重新排队
+        if earlier:
+            self.wheel.add(self)
+
+    def cancel(self):
+        """连接关闭前调用，之后时间轮不会再碰这个连接"""
+        with self.wheel.lock:
+            self.done = True
+
+class TimerWheel:
+    """哈希时间轮
+
+    每 resolution 秒一个槽，到期检查只看当前槽里的连接，不用每秒扫描
+    全部连接；阶段切换只改期限，不需要从轮上删除。expire() 可以在事件
+    循环里调用，也可以用 start() 启动一个后台线程，为阻塞式的线程模式
+    统一检查期限。
+    """
+
+    def __init__(self, resolution=0.25, slots=512):
+        self.resolution = resolution
+        self.lock = threading.RLock()
+        self._slots = [[] for _ in range(slots)]
+        self._tick = int(time.monotonic() / resolution)
+        self._thread = None
+
+    def deadline(self, timeouts, on_expire, phase, data=None):
+        """登记一个连接，返回它的 Deadline"""
+        deadline = Deadline(self, timeouts, on_expire, data)
+        deadline.set(phase)
+        return deadline
+
+    def add(self, deadline):
+        with self.lock:
+            self._insert(deadline)
+
+    def _insert(self, deadline):
+        tick = max(int(deadline.expires / self.resolution) + 1, self._tick)
+        # 超出一圈的期限先排在最远的槽，到时候还没到期会重新排队
+        tick = min(tick, self._tick + len(self._slots) - 1)
+        # 之前排在更晚的槽里的旧条目会因为 tick 不一致被丢弃
+        deadline.tick = tick
+        self._slots[tick % len(self._slots)].append(deadline)
+
+    def expire(self, now=None):
+        """处理到 now 为止到期的连接，返回处理的数量
+
+        回调在持有锁的情况下调用，和 Deadline.cancel() 互斥：
+        已经关闭的连接（socket 可能已被复用）不会再被回调。
+        """
+        if now is None:
+            now = time.monotonic()
+        target = int(now / self.resolution)
+        count = 0
+        with self.lock:
+            steps = min(target - self._tick + 1, len(self._slots))
+            if steps <= 0:
+                return 0
+            due = []
+            for _ in range(steps):
+                index = self._tick % len(self._slots)
+                due.extend((self._tick, deadline) for deadline in self._slots[index])
+                self._slots[index] = []
+                self._tick += 1
+            self._tick = max(self._tick, target + 1)
+            for tick, deadline in due:
+                if deadline.done or deadline.expired or deadline.tick != tick:
+                    continue
+                if deadline.expires > now:
+                    self._insert(deadline)
+                    continue
+                deadline.expired = True
+                count += 1
+                metrics.connection_reaped(deadline.phase)
+                try:
+                    deadline.on_expire(deadline)
+                except Exception as e:
+                    print(f"关闭超时连接时出错: {e}")
+        return count
+
+    def start(self):
+        """启动后台检查线程（重复调用只启动一次）"""
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.resolution)
+            self.expire()
+
+def discard_output(sock):
+    """关闭时直接丢弃内核里还没发出的数据（发送RST），不再等读得很慢的客户端"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    except OSError:
+        pass
+
+def reap_socket(deadline):
+    """关闭阻塞式连接：读请求阶段先尽量发出408，再 shutdown 让处理线程从 recv/send 中返回"""
+    sock = deadline.data
+    if deadline.phase in ('header', 'body'):
+        try:
+            sock.send(REQUEST_TIMEOUT, getattr(socket, 'MSG_DONTWAIT', 0))
+        except OSError:
+            pass
+    elif deadline.phase == 'write':
+        discard_output(sock)
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+# 线程模式下所有连接共享的时间轮
+timer_wheel = TimerWheel()
@@ -1,9 +1,51 @@
 #!/usr/bin/env python3
-import socket
+import argparse
+import os
 import threading
 import time
 from datetime import datetime
 
+from access_log import AccessLog
+from clock import clock, per_second
+from templates import Template, JSONTemplate
+from json_response import JSON_TYPE, dump_json
+from metrics import metrics, PROMETHEUS_TYPE
+from deadlines import Timeouts, timer_wheel, reap_socket, HEADER_TIMEOUT, BODY_TIMEOUT, WRITE_TIMEOUT
+from vectored import send_buffers, close_regions
+from static_files import StaticFiles
+from compression import negotiate, compress_response, encoding_headers, MIN_SIZE
+from caching import CachePolicy, apply_cache_policy
+from batch import Batch, MAX_BATCH_REQUESTS
+from routes import Router, Response
+from sse import event_stream, TIME_CHANNEL
+from websocket import websocket_upgrade, add_status_source
+from listener import create_listener, read_listen_overflows
+from selector_server import SelectorServer
+from http_parser import RequestParser, HTTPParseError, build_error_response
+from worker_pool import WorkerPool, OVERFLOW_POLICIES
+from admission import Admission
+
+# 访问日志：请求线程只入队，由后台线程写出
+access_log = AccessLog()
+
+# /static/ 路由对应的目录，可用 --static-dir 修改
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+static_files = StaticFiles(STATIC_DIR)
+
+# keep-alive 连接的空闲超时（秒）和单连接最大请求数
+KEEPALIVE_TIMEOUT = 15
+MAX_KEEPALIVE_REQUESTS = 100
+# 连接各阶段的期限（idle 即 keep-alive 空闲超时），由 main 按启动参数重新生成
+TIMEOUTS = Timeouts(idle=KEEPALIVE_TIMEOUT)
+# JSON等动态响应超过这个大小才压缩
+COMPRESS_MIN_SIZE = MIN_SIZE
+
+# 监听的端口列表（/api/status 中返回）
+LISTEN_PORTS_JSON = '[80, 8000]'
+
+# 所有端口共享的工作线程池（None 表示每个连接一个线程）
+worker_pool = None
+
 def get_client_ip(client_socket):
     """获取客户端IP地址"""
     try:
@@ -13,36 +55,72 @@ def get_client_ip(client_socket):
         return "unknown"
 
 def handle_request(client_socket, client_address):
-    """处理单个HTTP请求"""
+    """处理一个连接上的HTTP请求，支持keep-alive和管线化"""
+    parser = RequestParser()
+    served = 0
+    keep_open = True
+    client_ip = get_client_ip(client_socket)
+    metrics.connection_opened(client_ip)
+    # 各阶段的期限由共享的时间轮线程检查，超时后由它关闭socket，recv/send 随之返回
+    deadline = timer_wheel.deadline(TIMEOUTS, reap_socket, 'header', client_socket)
     try:
-        # 接收请求数据
-        request_data = client_socket.recv(4096).decode('utf-8')
-        if not request_data:
-            return
+        client_socket.setblocking(True)
         
-        # 解析请求行
-        lines = request_data.split('\n')
-        if not lines:
-            return
+        while keep_open:
+            data = client_socket.recv(65536)
+            if not data:
+                break
             
-        request_line = lines[0].strip()
-        parts = request_line.split()
-        if len(parts) < 2:
-            return
+            # 增量解析，数据不足时继续接收
+            try:
+                requests = parser.feed(data)
+            except HTTPParseError as e:
+                access_log.message(f"请求解析失败 ({e.status}) from {client_ip}: {e}")
+                client_socket.sendall(build_error_response(e.status))
+                break
             
-        method = parts[0]
-        path = parts[1]
-        
-        # 获取客户端IP和当前时间
-        client_ip = get_client_ip(client_socket)
-        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # 记录访问日志
-        print(f"[{current_time}] {method} {path} from {client_ip}")
+            # 按顺序响应管线化的请求
+            for request in requests:
+                served += 1
+                keep_alive = request.keep_alive and served < MAX_KEEPALIVE_REQUESTS
+                request.client_ip = client_ip
+                response = build_response(request, keep_alive)
+                deadline.set('write')
+                send_buffers(client_socket, response)
+                if request.upgrade is not None:
+                    # 连接交给事件流/WebSocket 的事件循环，这个线程不再处理它
+                    deadline.cancel()
+                    request.upgrade(client_socket)
+                    return
+                if not keep_alive:
+                    keep_open = False
+                    break
+            if keep_open and parser.error is not None:
+                # 同一批数据里格式错误的请求：前面的请求已经响应，再回复错误
+                access_log.message(f"请求解析失败 ({parser.error.status}) from {client_ip}: {parser.error}")
+                client_socket.sendall(build_error_response(parser.error.status))
+                break
+            deadline.set(parser.phase)
         
-        # 生成响应内容
-        if path == '/' or path == '':
-            content = """<!DOCTYPE html>
+    except Exception as e:
+        # 被时间轮关闭的连接上 recv/send 出错是预期的
+        if not deadline.expired:
+            print(f"处理请求时出错: {e}")
+            try:
+                error_response = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                client_socket.sendall(error_response)
+            except:
+                pass
+    finally:
+        deadline.cancel()
+        metrics.connection_closed(client_ip)
+        try:
+            client_socket.close()
+        except:
+            pass
+
+# 页面模板在启动时预编译，请求时只填充时间、IP、路径等动态值
+INDEX_PAGE = Template("""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -148,10 +226,10 @@ def handle_request(client_socket, client_address):
         
         <div class="info-card">
             <h3>📊 连接信息</h3>
-            <p><strong>⏰ 当前时间:</strong> """ + current_time + """</p>
-            <p><strong>🌐 您的IP地址:</strong> """ + client_ip + """</p>
-            <p><strong>📍 请求路径:</strong> """ + path + """</p>
-            <p><strong>🔧 请求方法:</strong> """ + method + """</p>
+            <p><strong>⏰ 当前时间:</strong> {{current_time}}</p>
+            <p><strong>🌐 您的IP地址:</strong> {{client_ip}}</p>
+            <p><strong>📍 请求路径:</strong> {{path}}</p>
+            <p><strong>🔧 请求方法:</strong> {{method}}</p>
         </div>
         
         <div class="api-section">
@@ -185,23 +263,9 @@ def handle_request(client_socket, client_address):
         </div>
     </div>
 </body>
-</html>"""
-            content_type = "text/html; charset=utf-8"
-            
-        elif path == '/api/time':
-            content = '{"time": "' + current_time + '", "client_ip": "' + client_ip + '", "timestamp": ' + str(time.time()) + '}'
-            content_type = "application/json; charset=utf-8"
-            
-        elif path == '/api/hello':
-            content = '{"message": "Hello from Python! 👋", "client_ip": "' + client_ip + '", "server_time": "' + current_time + '"}'
-            content_type = "application/json; charset=utf-8"
-            
-        elif path == '/api/status':
-            content = '{"server": "Python Socket Server", "status": "running", "version": "1.0.0", "ports": [80, 8000], "client_ip": "' + client_ip + '", "server_time": "' + current_time + '"}'
-            content_type = "application/json; charset=utf-8"
-            
-        else:
-            content = """<!DOCTYPE html>
+</html>""")
+
+NOT_FOUND_PAGE = Template("""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -258,9 +322,9 @@ def handle_request(client_socket, client_address):
         <h2>页面未找到</h2>
         
         <div class="error-info">
-            <p><strong>请求页面:</strong> """ + path + """</p>
-            <p><strong>错误时间:</strong> """ + current_time + """</p>
-            <p><strong>您的IP:</strong> """ + client_ip + """</p>
+            <p><strong>请求页面:</strong> {{path}}</p>
+            <p><strong>错误时间:</strong> {{current_time}}</p>
+            <p><strong>您的IP:</strong> {{client_ip}}</p>
         </div>
         
         <a href="/" class="btn">🏠 返回首页</a>
@@ -270,145 +334,292 @@ def handle_request(client_socket, client_address):
         </div>
     </div>
 </body>
-</html>"""
-            content_type = "text/html; charset=utf-8"
-        
-        # 编码内容
-        content_bytes = content.encode('utf-8')
-        content_length = len(content_bytes)
-        
-        # 构建HTTP响应
-        if path.startswith('/api/') and path not in ['/api/time', '/api/hello', '/api/status']:
-            status_line = "HTTP/1.1 404 Not Found\r\n"
-        elif path not in ['/', '', '/api/time', '/api/hello', '/api/status']:
-            status_line = "HTTP/1.1 404 Not Found\r\n"
+</html>""")
+
+# JSON响应模板：字符串值按JSON规则转义后拼进预先编码好的片段
+TIME_JSON = JSONTemplate('{"time": "{{time}}", "client_ip": "{{client_ip}}", "timestamp": {{timestamp|raw}}}')
+HELLO_JSON = JSONTemplate('{"message": "Hello from Python! 👋", "client_ip": "{{client_ip}}", "server_time": "{{server_time}}"}')
+STATUS_JSON = JSONTemplate('{"server": "Python Socket Server", "status": "running", "version": "1.0.0", "ports": {{ports|raw}}, "client_ip": "{{client_ip}}", "server_time": "{{server_time}}"{{extra|raw}}}')
+POOL_JSON = JSONTemplate(', "pool": {"workers": {{workers|raw}}, "busy": {{busy|raw}}, "queued": {{queued|raw}}, "rejected": {{rejected|raw}}}')
+OVERFLOWS_JSON = JSONTemplate(', "listen_overflows": {{overflows|raw}}, "listen_drops": {{drops|raw}}')
+METRICS_JSON = JSONTemplate(', "metrics": {{summary|raw}}')
+
+# 页面内容带有当前时间和客户端IP：只允许浏览器缓存，每次都用弱 ETag 重新验证
+PAGE_CACHE = CachePolicy(private=True, no_cache=True, weak=True)
+# 每次都不同的 API（时间、运行状态）
+NO_STORE = CachePolicy(no_store=True)
+# 个性化的 API：只允许浏览器缓存，并且需要重新验证
+PRIVATE_CACHE = CachePolicy(private=True, no_cache=True)
+
+def not_found(request):
+    """404 页面"""
+    encoding = negotiate(request.headers.get('accept-encoding'))
+    content = NOT_FOUND_PAGE.render_parts(
+        encoding, current_time=clock.now_str(), client_ip=request.client_ip, path=request.path)
+    return Response(404, content, headers=encoding_headers(encoding))
+
+# 路由表：固定路径一次字典查找即可分发
+router = Router(not_found=not_found)
+
+@router.route('*', '/', cache=PAGE_CACHE)
+def index(request):
+    """首页"""
+    encoding = negotiate(request.headers.get('accept-encoding'))
+    content = INDEX_PAGE.render_parts(
+        encoding, current_time=clock.now_str(), client_ip=request.client_ip, path=request.path, method=request.method)
+    return Response(200, content, headers=encoding_headers(encoding))
+
+@router.route('*', '/api/time', cache=NO_STORE)
+def api_time(request):
+    timestamp, current_time = clock.now()
+    content = TIME_JSON.render(time=current_time, client_ip=request.client_ip, timestamp=timestamp)
+    return Response(200, content, JSON_TYPE)
+
+@router.route('GET', '/api/time/stream', cache=NO_STORE)
+def api_time_stream(request):
+    """每秒推送一次服务器时间（Server-Sent Events），代替轮询 /api/time"""
+    return event_stream(request, TIME_CHANNEL)
+
+@router.route('*', '/api/hello', cache=PRIVATE_CACHE)
+def api_hello(request):
+    content = HELLO_JSON.render(client_ip=request.client_ip, server_time=clock.now_str())
+    return Response(200, content, JSON_TYPE)
+
+@per_second
+def status_extra():
+    """线程池状态、监听队列溢出和指标摘要：要读 /proc 并合并所有分片，每秒只算一次"""
+    extra = b''
+    if worker_pool is not None:
+        extra += POOL_JSON.render(**worker_pool.stats())
+    overflows = read_listen_overflows()
+    if overflows is not None:
+        extra += OVERFLOWS_JSON.render(**overflows)
+    extra += METRICS_JSON.render(summary=dump_json(metrics.summary()).decode('utf-8'))
+    return extra.decode('utf-8')
+
+def status_json(client_ip=''):
+    """/api/status 的内容；WebSocket 广播的状态不针对某个客户端，client_ip 为空"""
+    return STATUS_JSON.render(ports=LISTEN_PORTS_JSON, client_ip=client_ip, server_time=clock.now_str(),
+                              extra=status_extra())
+
+@router.route('*', '/api/status', cache=NO_STORE)
+def api_status(request):
+    return Response(200, status_json(request.client_ip), JSON_TYPE)
+
+add_status_source(status_json)
+
+@router.route('GET', '/ws', cache=NO_STORE)
+def ws(request):
+    """WebSocket：推送时间和状态，接收 greet 消息"""
+    return websocket_upgrade(request)
+
+@router.route('GET', '/api/metrics', cache=NO_STORE)
+def api_metrics(request):
+    """Prometheus 格式的指标"""
+    return Response(200, metrics.prometheus().encode('utf-8'), PROMETHEUS_TYPE)
+
+# 批量接口：多个子请求在进程内分发给同一个路由表，结果合并成一个JSON响应
+batch = router.add('POST', '/api/batch', Batch(router), cache=NO_STORE)
+
+@router.route('GET', '/static/*')
+def static(request):
+    """静态文件"""
+    return static_files.serve(request) or not_found(request)
+
+def build_response(request, keep_alive=False):
+    """分发请求并生成完整的HTTP响应，返回字节段列表（交给 sendmsg 一次写出）"""
+    response = router.dispatch(request)
+    compress_response(response, request.headers.get('accept-encoding'), COMPRESS_MIN_SIZE)
+    apply_cache_policy(response, request.method, request.headers.get('if-none-match'))
+    
+    # 记录访问日志（只入队，不阻塞响应）
+    access_log.log(request.method, request.path, request.client_ip, response.status, response.length)
+    
+    # 101 的 Connection: Upgrade 由 WebSocket 握手的响应头给出
+    connection = "" if response.status == 101 else f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+    head = response.head_bytes()
+    tail = f"{connection}Date: {clock.http_date()}\r\nServer: Python-Dual-Port-Server\r\n\r\n"
+    tail = tail.encode('utf-8')
+    if request.method == 'HEAD':
+        # HEAD 只发响应头（Content-Length 和 GET 一样），否则 keep-alive 连接上的下一个响应会错位
+        close_regions(response.body_parts())
+        request.upgrade = None
+        metrics.observe(request.route, request.client_ip, response.status, time.perf_counter() - request.received,
+                        request.size, len(head) + len(tail))
+        return [head, tail]
+    metrics.observe(request.route, request.client_ip, response.status, time.perf_counter() - request.received,
+                    request.size, len(head) + len(tail) + response.length)
+    return [head, tail, *response.body_parts()]
+
+def dispatch_connections(connections, pool=None, admission=None):
+    """把一次accept到的一批连接交给线程池，或为每个连接创建线程
+
+    admission 不为空时超过并发上限的连接排队或直接返回503，不创建线程。
+    """
+    if pool is not None:
+        pool.submit_batch(connections)
+        return
+    for client_socket, client_address in connections:
+        if admission is None:
+            target, args = handle_request, (client_socket, client_address)
+        elif admission.submit(client_socket, client_address):
+            target, args = admission.serve, (handle_request, client_socket, client_address)
         else:
-            status_line = "HTTP/1.1 200 OK\r\n"
-            
-        headers = f"""Content-Type: {content_type}\r
-Content-Length: {content_length}\r
-Connection: close\r
-Server: Python-Dual-Port-Server\r
-\r
-"""
-        
-        # 发送响应
-        response = (status_line + headers).encode('utf-8') + content_bytes
-        client_socket.sendall(response)
-        
+            continue
+        client_thread = threading.Thread(
+            target=target,
+            args=args,
+            daemon=True
+        )
+        client_thread.start()
+
+def open_listener(port, backlog=None):
+    """在 :: 上创建双栈监听socket，失败时回退到IPv4"""
+    try:
+        print(f"[端口 {port}] 启动IPv6服务器在 [::]:{port}")
+        return create_listener('::', port, backlog, prefix=f"[端口 {port}] ")
     except Exception as e:
-        print(f"处理请求时出错: {e}")
-        try:
-            error_response = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
-            client_socket.sendall(error_response)
-        except:
-            pass
+        print(f"[端口 {port}] IPv6启动失败: {e}")
+    try:
+        print(f"[端口 {port}] 启动IPv4服务器在 0.0.0.0:{port}")
+        return create_listener('0.0.0.0', port, backlog, prefix=f"[端口 {port}] ")
+    except Exception as e:
+        print(f"[端口 {port}] 服务器启动失败: {e}")
+        if port == 80:
+            print("提示：监听80端口需要管理员权限，请使用 sudo python3 script.py")
+        return None
+
+def run_event_loop(listeners, mode='selector', pool=None, max_connections=None, max_queued=0):
+    """用一个事件循环服务所有监听socket
+
+    selector 模式下连接的读写也在事件循环里完成；thread/pool 模式下
+    事件循环只负责accept，连接整批交给新线程或线程池。max_connections
+    限制 selector/thread 模式下同时处理的连接数，超出的返回503。
+    """
+    on_accept = None
+    if mode != 'selector':
+        admission = None
+        if mode == 'thread' and max_connections is not None:
+            admission = Admission(max_connections, max_queued)
+            metrics.add_admission(admission)
+            print(f"准入控制: 最多 {max_connections} 个并发连接, 排队 {max_queued} 个")
+        on_accept = lambda batch: dispatch_connections(batch, pool, admission)
+        # 阻塞式的连接线程由时间轮线程统一检查超时
+        timer_wheel.start()
+    if pool is not None:
+        metrics.add_worker_pool(pool)
+    server = SelectorServer(build_response, TIMEOUTS, MAX_KEEPALIVE_REQUESTS, on_accept,
+                            max_connections if mode == 'selector' else None)
+    for server_socket in listeners:
+        server.add_listener(server_socket)
+    try:
+        server.serve_forever()
     finally:
-        try:
-            client_socket.close()
-        except:
-            pass
+        for server_socket in listeners:
+            try:
+                server_socket.close()
+            except:
+                pass
 
-def start_server(host, port):
-    """启动单个端口的HTTP服务器"""
-    # 确定地址族
+def start_server(host, port, pool=None, backlog=None):
+    """启动单个端口的HTTP服务器，pool 不为空时使用线程池处理连接，否则在事件循环中处理"""
     if ':' in host:
-        family = socket.AF_INET6
         print(f"[端口 {port}] 启动IPv6服务器在 [{host}]:{port}")
     else:
-        family = socket.AF_INET
         print(f"[端口 {port}] 启动IPv4服务器在 {host}:{port}")
     
-    # 创建socket
-    server_socket = socket.socket(family, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
-    # IPv6双栈支持
-    if family == socket.AF_INET6:
-        try:
-            server_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
-            print(f"[端口 {port}] 启用IPv6双栈支持")
-        except:
-            print(f"[端口 {port}] IPv6双栈支持失败，仅IPv6")
-    
     try:
-        server_socket.bind((host, port))
-        server_socket.listen(5)
-        
-        print(f"[端口 {port}] 绑定成功，开始监听连接...")
-        
-        while True:
-            try:
-                client_socket, client_address = server_socket.accept()
-                # 为每个连接创建新线程
-                client_thread = threading.Thread(
-                    target=handle_request,
-                    args=(client_socket, client_address),
-                    daemon=True
-                )
-                client_thread.start()
-                
-            except Exception as e:
-                if "interrupted" not in str(e).lower():
-                    print(f"[端口 {port}] 接受连接时出错: {e}")
-                break
-                
+        server_socket = create_listener(host, port, backlog, prefix=f"[端口 {port}] ")
     except Exception as e:
         print(f"[端口 {port}] 服务器启动失败: {e}")
         if port == 80:
             print("提示：监听80端口需要管理员权限，请使用 sudo python3 script.py")
         raise e
+    
+    print(f"[端口 {port}] 绑定成功，开始监听连接...")
+    try:
+        run_event_loop([server_socket], 'pool' if pool is not None else 'selector', pool)
+    except KeyboardInterrupt:
+        pass
     finally:
-        try:
-            server_socket.close()
-        except:
-            pass
         print(f"[端口 {port}] 服务器已停止")
 
-def start_server_thread(host, port):
-    """在独立线程中启动服务器"""
-    try:
-        start_server(host, port)
-    except Exception as e:
-        print(f"[端口 {port}] 服务器线程异常: {e}")
+def parse_args():
+    """解析启动参数"""
+    parser = argparse.ArgumentParser(description='Python 双端口 HTTP 服务器')
+    parser.add_argument('--ports', type=int, nargs='+', default=[80, 8000], help='监听端口列表')
+    parser.add_argument('--mode', choices=['selector', 'thread', 'pool'], default='selector',
+                        help='selector: 单个事件循环处理所有连接; thread: 每个连接一个线程; '
+                             'pool: 所有端口共享固定大小线程池')
+    parser.add_argument('--pool-size', type=int, default=16, help='线程池工作线程数量')
+    parser.add_argument('--queue-size', type=int, default=64, help='线程池等待队列长度')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='队列满时的策略: block 阻塞, shed 返回503, close 直接关闭')
+    parser.add_argument('--max-connections', type=int, default=None,
+                        help='最多同时处理的连接数（thread/selector 模式），超出后排队或返回503，默认不限制；pool 模式请用 --overflow shed')
+    parser.add_argument('--max-queued', type=int, default=0,
+                        help='thread 模式下超过 --max-connections 后最多排队的连接数')
+    parser.add_argument('--backlog', type=int, default=None,
+                        help='监听队列长度，默认使用系统的 somaxconn')
+    parser.add_argument('--access-log', default=None,
+                        help='访问日志文件路径，默认输出到标准输出')
+    parser.add_argument('--access-log-max-bytes', type=int, default=10 * 1024 * 1024,
+                        help='访问日志文件轮转大小（字节）')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help='keep-alive 连接的空闲超时（秒）')
+    parser.add_argument('--header-timeout', type=float, default=HEADER_TIMEOUT,
+                        help='收完请求头的期限（秒），超时返回408')
+    parser.add_argument('--body-timeout', type=float, default=BODY_TIMEOUT,
+                        help='收完请求体的期限（秒），超时返回408')
+    parser.add_argument('--write-timeout', type=float, default=WRITE_TIMEOUT,
+                        help='写完一个响应的期限（秒）')
+    parser.add_argument('--max-requests', type=int, default=MAX_KEEPALIVE_REQUESTS,
+                        help='单个连接上最多处理的请求数')
+    parser.add_argument('--batch-max-requests', type=int, default=MAX_BATCH_REQUESTS,
+                        help='/api/batch 一次最多包含的子请求数，超过时返回413')
+    parser.add_argument('--static-dir', default=STATIC_DIR, help='/static/ 路由对应的目录')
+    parser.add_argument('--static-max-age', type=int, default=3600,
+                        help='静态文件的 Cache-Control max-age（秒）')
+    parser.add_argument('--compress-min-size', type=int, default=COMPRESS_MIN_SIZE,
+                        help='JSON等动态响应超过这个大小（字节）才做gzip/deflate压缩')
+    return parser.parse_args()
 
 def main():
-    ports = [80, 8000]  # 监听80和8000端口
-    threads = []
+    global worker_pool, access_log, static_files, KEEPALIVE_TIMEOUT, MAX_KEEPALIVE_REQUESTS, TIMEOUTS, COMPRESS_MIN_SIZE, LISTEN_PORTS_JSON
+    args = parse_args()
+    KEEPALIVE_TIMEOUT = args.keepalive_timeout
+    MAX_KEEPALIVE_REQUESTS = args.max_requests
+    TIMEOUTS = Timeouts(args.header_timeout, args.body_timeout, args.keepalive_timeout, args.write_timeout)
+    COMPRESS_MIN_SIZE = args.compress_min_size
+    access_log = AccessLog(args.access_log, max_bytes=args.access_log_max_bytes)
+    static_files = StaticFiles(args.static_dir, args.static_max_age)
+    batch.max_requests = args.batch_max_requests
+    ports = args.ports  # 默认监听80和8000端口
+    LISTEN_PORTS_JSON = '[' + ', '.join(str(port) for port in ports) + ']'
     
     print("=== Python双端口HTTP服务器 ===")
     print(f"准备启动端口: {ports}")
     print(f"启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if args.mode == 'pool':
+        worker_pool = WorkerPool(
+            handle_request,
+            size=args.pool_size,
+            queue_size=args.queue_size,
+            overflow=args.overflow
+        ).start()
+        print(f"线程池模式: {args.pool_size} 个工作线程, 队列长度 {args.queue_size}, 溢出策略 {args.overflow}")
     print()
     
+    listeners = []
     for port in ports:
-        try:
-            # 为每个端口创建独立线程
-            server_thread = threading.Thread(
-                target=start_server_thread,
-                args=('::', port),
-                daemon=True
-            )
-            server_thread.start()
-            threads.append(server_thread)
-            print(f"✅ 端口 {port} 线程启动成功")
-            time.sleep(0.1)  # 稍微延迟避免日志混乱
-        except Exception as e:
-            print(f"❌ 端口 {port} 启动失败: {e}")
-            # 如果IPv6失败，尝试IPv4
-            try:
-                server_thread = threading.Thread(
-                    target=start_server_thread,
-                    args=('0.0.0.0', port),
-                    daemon=True
-                )
-                server_thread.start()
-                threads.append(server_thread)
-                print(f"✅ 端口 {port} IPv4模式启动成功")
-            except Exception as e2:
-                print(f"❌ 端口 {port} IPv4也失败: {e2}")
+        server_socket = open_listener(port, args.backlog)
+        if server_socket is None:
+            print(f"❌ 端口 {port} 启动失败")
+            continue
+        listeners.append(server_socket)
+        print(f"✅ 端口 {port} 监听成功")
     
-    if threads:
+    if listeners:
         print()
         print("🚀 服务器启动完成！")
         print("📡 监听端口:", ports)
@@ -422,11 +633,14 @@ def main():
         print()
         
         try:
-            # 保持主线程运行
-            while True:
-                time.sleep(1)
+            # 所有端口的accept和客户端IO都在这一个事件循环里
+            run_event_loop(listeners, args.mode, worker_pool, args.max_connections, args.max_queued)
         except KeyboardInterrupt:
             print("\n⏹️  正在停止所有服务器...")
+            if worker_pool is not None:
+                print(f"线程池状态: {worker_pool.stats()}")
+                worker_pool.shutdown()
+            access_log.close()
             print("👋 服务器已停止")
     else:
         print("❌ 所有端口启动失败！")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import re
+import time
+
+# 默认限制：请求头总长度和请求体长度
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+# 分块编码中单行（块大小行/尾部字段）的最大长度
+MAX_CHUNK_LINE = 4096
+# 块大小只能是十六进制数字（chunk-size = 1*HEXDIG），最多16位
+CHUNK_SIZE_PATTERN = re.compile(rb'[0-9A-Fa-f]{1,16}')
+
+STATUS_REASONS = {
+    400: 'Bad Request',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+}
+
+class HTTPParseError(Exception):
+    """请求解析失败，status 为应返回给客户端的状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class HTTPRequest:
+    """解析完成的HTTP请求
+
+    received 是收到完整请求的时间（perf_counter），size 是请求在线路上的
+    字节数，route 是匹配到的路由（由 Router 填入），都用于统计指标。
+    stream 是还没读取的请求体（request_body.BodyReader），只有流式处理
+    请求体的请求才有，此时 body 为空。upgrade 由处理函数设置（事件流、
+    WebSocket）：服务器发出响应头后调用 upgrade(sock) 交出连接，之后不再
+    读写、也不关闭它。
+    """
+    __slots__ = ('method', 'path', 'version', 'headers', 'body', 'client_ip', 'params',
+                 'route', 'received', 'size', 'stream', 'upgrade')
+
+    def __init__(self, method, path, version, headers, body=b'', client_ip='unknown'):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.client_ip = client_ip
+        self.params = {}
+        self.route = None
+        self.received = time.perf_counter()
+        self.size = 0
+        self.stream = None
+        self.upgrade = None
+
+    @property
+    def keep_alive(self):
+        return wants_keep_alive(self.version, self.headers)
+
+    def __repr__(self):
+        return f"<HTTPRequest {self.method} {self.path} {self.version}>"
+
+def parse_request_head(head):
+    """解析请求行和请求头，返回 (method, path, version, headers)，格式错误时抛出 HTTPParseError"""
+    lines = head.split(b'\r\n')
+    parts = lines[0].split(b' ')
+    if len(parts) != 3 or not parts[0] or not parts[1]:
+        raise HTTPParseError(400, "请求行格式错误")
+    version = parts[2].decode('latin-1')
+    if not version.startswith('HTTP/1.'):
+        raise HTTPParseError(400, f"不支持的协议版本: {version}")
+    method = parts[0].decode('latin-1')
+    path = parts[1].decode('utf-8', 'replace')
+
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(b':')
+        if not sep or not name or name != name.strip():
+            raise HTTPParseError(400, "请求头格式错误")
+        name = name.decode('latin-1').lower()
+        value = value.strip().decode('latin-1')
+        if name in headers:
+            headers[name] += ', ' + value
+        else:
+            headers[name] = value
+    return method, path, version, headers
+
+def parse_chunk_size(line):
+    """解析块大小行（不含CRLF，可以带 ;扩展），格式错误时抛出 HTTPParseError(400)
+
+    int(x, 16) 还接受 0x5、+2、1_0 和前后的空白；前面的代理按语法切分
+    请求体时会和我们不一致（请求走私），所以先严格校验再转换。
+    """
+    size_text, sep, _ = line.partition(b';')
+    if sep:
+        # 扩展前允许空白（BWS）
+        size_text = size_text.rstrip(b' \t')
+    if not CHUNK_SIZE_PATTERN.fullmatch(size_text):
+        raise HTTPParseError(400, "分块大小格式错误")
+    return int(size_text, 16)
+
+def wants_keep_alive(version, headers):
+    """根据HTTP版本和Connection头判断是否保持连接"""
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return 'close' not in connection
+    return 'keep-alive' in connection
+
+def build_error_response(status):
+    """生成解析失败时返回的响应（随后关闭连接）"""
+    reason = STATUS_REASONS.get(status, 'Bad Request')
+    return (f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: close\r\n\r\n").encode('latin-1')
+
+class RequestParser:
+    """增量式HTTP请求解析器
+
+    每次收到数据调用 feed()，返回本次解析完成的请求列表（可能为空，
+    管线化时可能有多个）。格式错误或超出限制时抛出 HTTPParseError，
+    之后该连接不能再使用；同一批数据里出错之前已经完整的请求照常返回，
+    错误保存在 error 里，下次调用 feed() 时抛出，服务器先回复前面的请求
+    再回复错误。
+    """
+
+    def __init__(self, max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self._buffer = bytearray()
+        self._pos = 0
+        self._state = 'head'
+        self._request = None
+        self._remaining = 0
+        self._chunks = []
+        self._body_size = 0
+        self._trailer_size = 0
+        self._size = 0
+        # 已经返回了前面的请求、还没有抛出的解析错误
+        self.error = None
+
+    @property
+    def phase(self):
+        """连接当前所处的读阶段：'idle' 没有未完成的请求，'header' 正在收请求头，'body' 正在收请求体"""
+        if self._state == 'head':
+            return 'idle' if self._pos == len(self._buffer) else 'header'
+        return 'body'
+
+    def feed(self, data):
+        """喂入新收到的数据，返回解析完成的请求列表"""
+        if self.error is not None:
+            raise self.error
+        self._buffer += data
+        completed = []
+        while True:
+            try:
+                request = self._step()
+            except HTTPParseError as e:
+                if not completed:
+                    raise
+                self.error = e
+                return completed
+            if request is None:
+                break
+            completed.append(request)
+        # 丢弃已经解析过的数据
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._pos = 0
+        return completed
+
+    def _step(self):
+        """推进状态机，得到完整请求时返回它，数据不足时返回 None"""
+        while True:
+            if self._state == 'head':
+                if not self._read_head():
+                    return None
+            elif self._state == 'body':
+                available = len(self._buffer) - self._pos
+                if available < self._remaining:
+                    return None
+                end = self._pos + self._remaining
+                self._request.body = bytes(self._buffer[self._pos:end])
+                self._size += self._remaining
+                self._pos = end
+                return self._finish()
+            elif self._state == 'chunk_size':
+                line = self._read_line()
+                if line is None:
+                    return None
+                size = parse_chunk_size(line)
+                if size == 0:
+                    self._state = 'chunk_trailer'
+                    continue
+                self._body_size += size
+                if self._body_size > self.max_body_size:
+                    raise HTTPParseError(413, "请求体过大")
+                self._remaining = size
+                self._state = 'chunk_data'
+            elif self._state == 'chunk_data':
+                available = len(self._buffer) - self._pos
+                if available < self._remaining + 2:
+                    return None
+                end = self._pos + self._remaining
+                if self._buffer[end:end + 2] != b'\r\n':
+                    raise HTTPParseError(400, "分块数据格式错误")
+                self._chunks.append(bytes(self._buffer[self._pos:end]))
+                self._size += end + 2 - self._pos
+                self._pos = end + 2
+                self._state = 'chunk_size'
+            elif self._state == 'chunk_trailer':
+                line = self._read_line()
+                if line is None:
+                    return None
+                self._trailer_size += len(line) + 2
+                self._size += len(line) + 2
+                if self._trailer_size > self.max_header_size:
+                    raise HTTPParseError(431, "尾部字段过大")
+                if line:
+                    continue
+                self._request.body = b''.join(self._chunks)
+                return self._finish()
+
+    def _read_head(self):
+        # 跳过请求之间多余的空行
+        while self._buffer.startswith(b'\r\n', self._pos):
+            self._pos += 2
+        end = self._buffer.find(b'\r\n\r\n', self._pos)
+        if end == -1:
+            if len(self._buffer) - self._pos > self.max_header_size:
+                raise HTTPParseError(431, "请求头过大")
+            return False
+        if end - self._pos > self.max_header_size:
+            raise HTTPParseError(431, "请求头过大")
+
+        method, path, version, headers = parse_request_head(bytes(self._buffer[self._pos:end]))
+        self._size = end + 4 - self._pos
+        self._pos = end + 4
+        self._request = HTTPRequest(method, path, version, headers)
+
+        transfer_encoding = headers.get('transfer-encoding', '').lower()
+        if transfer_encoding:
+            if transfer_encoding != 'chunked':
+                raise HTTPParseError(400, f"不支持的传输编码: {transfer_encoding}")
+            self._chunks = []
+            self._body_size = 0
+            self._trailer_size = 0
+            self._state = 'chunk_size'
+            return True
+
+        length_text = headers.get('content-length')
+        if length_text is None:
+            self._remaining = 0
+        else:
+            if not length_text.isdigit():
+                raise HTTPParseError(400, "Content-Length 格式错误")
+            self._remaining = int(length_text)
+            if self._remaining > self.max_body_size:
+                raise HTTPParseError(413, "请求体过大")
+        self._state = 'body'
+        return True
+
+    def _read_line(self):
+        end = self._buffer.find(b'\r\n', self._pos)
+        if end == -1:
+            if len(self._buffer) - self._pos > MAX_CHUNK_LINE:
+                raise HTTPParseError(400, "分块行过长")
+            return None
+        line = bytes(self._buffer[self._pos:end])
+        self._pos = end + 2
+        return line
+
+    def _finish(self):
+        request = self._request
+        request.size = self._size
+        request.received = time.perf_counter()
+        self._request = None
+        self._chunks = []
+        self._state = 'head'
+        return request
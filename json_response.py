@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import json
+
+from caching import make_etag
+from routes import Response, response_head
+
+JSON_TYPE = 'application/json; charset=utf-8'
+
+def dump_json(data):
+    """序列化成UTF-8编码的JSON字节"""
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+class ConstantJSON:
+    """启动时序列化好的常量JSON响应
+
+    响应体、ETag 和状态行加固定响应头（Content-Type、Content-Length、
+    额外的头、Cache-Control、ETag）都只生成一次，请求时只追加
+    Connection/Date/Server。cache 是 CachePolicy，在这里直接写进响应头，
+    路由上不要再声明。
+    """
+
+    def __init__(self, data, status=200, content_type=JSON_TYPE, headers=(), cache=None):
+        self.status = status
+        self.content_type = content_type
+        self.body = dump_json(data)
+        self.headers = list(headers)
+        self.etag = None
+        self.head = None
+        if cache is not None:
+            self.headers.append(('Cache-Control', cache.cache_control))
+            if not cache.no_store:
+                self.etag = make_etag(self.body, cache.weak)
+                self.headers.append(('ETag', self.etag))
+        self.head = response_head(self.response()).encode('utf-8')
+
+    def response(self):
+        """为本次请求生成 Response，共享预先生成的字节，不复制"""
+        return Response(self.status, self.body, self.content_type, self.headers,
+                        self.etag, self.head)
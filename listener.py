@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import selectors
+import socket
+import time
+
+# 内核允许的最大监听队列长度
+SOMAXCONN_PATH = '/proc/sys/net/core/somaxconn'
+# 内核TCP扩展统计，其中包含监听队列溢出计数
+NETSTAT_PATH = '/proc/net/netstat'
+# 一次唤醒最多accept的连接数
+ACCEPT_BATCH = 64
+
+def default_backlog():
+    """默认监听队列长度：系统的 somaxconn"""
+    try:
+        with open(SOMAXCONN_PATH) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return socket.SOMAXCONN
+
+def create_listener(host, port, backlog=None, reuse_port=False, prefix=''):
+    """创建并绑定监听socket
+
+    IPv6 地址会关闭 IPV6_V6ONLY 以同时接收 IPv4 连接；reuse_port 为真时
+    设置 SO_REUSEPORT，允许多个进程各自绑定同一端口，由内核分配连接。
+    backlog 为空时使用 somaxconn。绑定失败时关闭socket并抛出异常。
+    """
+    if backlog is None:
+        backlog = default_backlog()
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    server_socket = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise OSError("当前系统不支持 SO_REUSEPORT")
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        # IPv6双栈支持
+        if family == socket.AF_INET6:
+            try:
+                server_socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+                print(f"{prefix}启用IPv6双栈支持")
+            except:
+                print(f"{prefix}IPv6双栈支持失败，仅IPv6")
+
+        server_socket.bind((host, port))
+        server_socket.listen(backlog)
+    except:
+        server_socket.close()
+        raise
+    return server_socket
+
+def accept_batch(server_socket, max_batch=ACCEPT_BATCH):
+    """非阻塞地accept，直到没有等待中的连接（EAGAIN）或达到上限"""
+    batch = []
+    while len(batch) < max_batch:
+        try:
+            batch.append(server_socket.accept())
+        except (BlockingIOError, InterruptedError):
+            break
+        except OSError:
+            # 例如文件描述符耗尽：先把已经拿到的连接交出去
+            if batch:
+                break
+            raise
+    return batch
+
+def accept_forever(server_socket, handle_batch, max_batch=ACCEPT_BATCH, prefix=''):
+    """批量accept循环
+
+    监听socket可读时一次取完所有等待中的连接，再整批交给
+    handle_batch([(client_socket, client_address), ...])。
+    """
+    server_socket.setblocking(False)
+    with selectors.DefaultSelector() as selector:
+        selector.register(server_socket, selectors.EVENT_READ)
+        while True:
+            selector.select()
+            try:
+                batch = accept_batch(server_socket, max_batch)
+            except OSError as e:
+                print(f"{prefix}接受连接时出错: {e}")
+                # 避免描述符耗尽时空转
+                time.sleep(0.1)
+                continue
+            if batch:
+                handle_batch(batch)
+
+def read_listen_overflows():
+    """读取内核统计的监听队列溢出次数
+
+    返回 {'overflows': ListenOverflows, 'drops': ListenDrops}，数值是本机
+    所有监听socket的累计值；非 Linux 系统返回 None。
+    """
+    try:
+        with open(NETSTAT_PATH) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for header, values in zip(lines[::2], lines[1::2]):
+        if not header.startswith('TcpExt:'):
+            continue
+        stats = dict(zip(header.split()[1:], values.split()[1:]))
+        try:
+            return {
+                'overflows': int(stats.get('ListenOverflows', 0)),
+                'drops': int(stats.get('ListenDrops', 0)),
+            }
+        except ValueError:
+            return None
+    return None
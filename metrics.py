@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+import bisect
+import threading
+import weakref
+
+# 延迟直方图的桶上界（秒）：每个数量级内 1..9 线性分桶，10µs 到 90s
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-5, 2) for m in range(1, 10))
+
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def address_family(client_ip):
+    """按客户端地址分类：ipv4、ipv4_mapped（双栈socket上的IPv4客户端）、ipv6"""
+    if ':' not in client_ip:
+        return 'ipv4'
+    if client_ip.startswith('::ffff:') and '.' in client_ip:
+        return 'ipv4_mapped'
+    return 'ipv6'
+
+class _Shard:
+    """一个线程自己的计数器，只有所属线程会修改"""
+    __slots__ = ('requests', 'latency', 'latency_sum', 'bytes_in', 'bytes_out', 'opened', 'closed', 'reaped', 'shed')
+
+    def __init__(self):
+        # (route, family, status) -> 请求数
+        self.requests = {}
+        # (route, family) -> 各个桶的计数（最后一个是 +Inf）
+        self.latency = {}
+        self.latency_sum = {}
+        # family -> 字节数 / 连接数
+        self.bytes_in = {}
+        self.bytes_out = {}
+        self.opened = {}
+        self.closed = {}
+        # 阶段 -> 因超时被关闭的连接数
+        self.reaped = {}
+        # family -> 过载时在accept路径上被拒绝（503）的连接数
+        self.shed = {}
+
+    def merge_into(self, total):
+        """把本分片累加到 total（读取时调用，不加锁地复制字典）"""
+        for name in ('requests', 'latency_sum', 'bytes_in', 'bytes_out', 'opened', 'closed', 'reaped', 'shed'):
+            target = getattr(total, name)
+            for key, value in dict(getattr(self, name)).items():
+                target[key] = target.get(key, 0) + value
+        for key, counts in dict(self.latency).items():
+            target = total.latency.get(key)
+            if target is None:
+                total.latency[key] = list(counts)
+            else:
+                for i, count in enumerate(list(counts)):
+                    target[i] += count
+
+class Metrics:
+    """请求指标
+
+    每个线程写自己的分片（threading.local），记录时不加锁；读取时再把
+    所有分片合并。线程结束后它的分片并入 retired，每连接一个线程的模式下
+    分片数量不会一直增长。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = set()
+        self._retired = _Shard()
+        self._gauges = {}
+        self.add_gauge('process_threads', '进程中的线程数', threading.active_count)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._shards.add(shard)
+        weakref.finalize(threading.current_thread(), self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            if shard in self._shards:
+                self._shards.discard(shard)
+                shard.merge_into(self._retired)
+
+    def observe(self, route, client_ip, status, seconds, bytes_in, bytes_out):
+        """记录一个已生成响应的请求"""
+        shard = self._shard()
+        family = address_family(client_ip)
+        key = (route, family, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        key = (route, family)
+        counts = shard.latency.get(key)
+        if counts is None:
+            counts = shard.latency[key] = [0] * (len(LATENCY_BUCKETS) + 1)
+        counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        shard.latency_sum[key] = shard.latency_sum.get(key, 0) + seconds
+        shard.bytes_in[family] = shard.bytes_in.get(family, 0) + bytes_in
+        shard.bytes_out[family] = shard.bytes_out.get(family, 0) + bytes_out
+
+    def connection_opened(self, client_ip):
+        opened = self._shard().opened
+        family = address_family(client_ip)
+        opened[family] = opened.get(family, 0) + 1
+
+    def connection_closed(self, client_ip):
+        closed = self._shard().closed
+        family = address_family(client_ip)
+        closed[family] = closed.get(family, 0) + 1
+
+    def connection_reaped(self, phase):
+        """一个连接因为读请求头/请求体、空闲或写响应超时被关闭"""
+        reaped = self._shard().reaped
+        reaped[phase] = reaped.get(phase, 0) + 1
+
+    def connection_shed(self, client_ip):
+        """一个连接因为超过准入上限被直接拒绝"""
+        shed = self._shard().shed
+        family = address_family(client_ip)
+        shed[family] = shed.get(family, 0) + 1
+
+    def add_gauge(self, name, help_text, callback):
+        """注册一个读取时才计算的数值（例如线程池状态）"""
+        self._gauges[name] = (help_text, callback)
+
+    def add_worker_pool(self, pool):
+        """导出线程池状态"""
+        for key, help_text in (('workers', '线程池工作线程数'), ('busy', '正在处理连接的工作线程数'),
+                               ('queued', '线程池队列中等待的连接数'), ('rejected', '队列满时被拒绝的连接数')):
+            self.add_gauge(f'worker_pool_{key}', help_text, lambda key=key: pool.stats()[key])
+
+    def add_admission(self, admission):
+        """导出准入控制状态"""
+        for key, help_text in (('active', '已接纳、正在处理的连接数'), ('queued', '已接纳、排队等待处理的连接数')):
+            self.add_gauge(f'admission_{key}', help_text, lambda key=key: admission.stats()[key])
+
+    def snapshot(self):
+        """合并所有分片，返回一个新的 _Shard"""
+        total = _Shard()
+        with self._lock:
+            self._retired.merge_into(total)
+            for shard in self._shards:
+                shard.merge_into(total)
+        return total
+
+    def gauges(self):
+        values = {}
+        for name, (help_text, callback) in list(self._gauges.items()):
+            try:
+                values[name] = (help_text, callback())
+            except Exception:
+                pass
+        return values
+
+    def summary(self):
+        """/api/status 中的摘要：总请求数、5xx、活动连接，以及按地址族的延迟分位数（毫秒）"""
+        total = self.snapshot()
+        families = {}
+        for (route, family), counts in total.latency.items():
+            merged = families.get(family)
+            if merged is None:
+                families[family] = list(counts)
+            else:
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        return {
+            'requests': sum(total.requests.values()),
+            'server_errors': sum(n for (_, _, status), n in total.requests.items() if status >= 500),
+            'active_connections': sum(total.opened.values()) - sum(total.closed.values()),
+            'reaped_connections': sum(total.reaped.values()),
+            'shed_connections': sum(total.shed.values()),
+            'families': {
+                family: {
+                    'requests': sum(counts),
+                    'p50_ms': _quantile_ms(counts, 0.5),
+                    'p99_ms': _quantile_ms(counts, 0.99),
+                }
+                for family, counts in sorted(families.items())
+            },
+        }
+
+    def prometheus(self):
+        """Prometheus 文本格式"""
+        total = self.snapshot()
+        lines = [
+            '# HELP http_requests_total 已处理的请求数',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, family, status), count in sorted(total.requests.items()):
+            lines.append(f'http_requests_total{{route="{_label(route)}",family="{family}",code="{status}"}} {count}')
+
+        lines.append('# HELP http_request_duration_seconds 从收到完整请求到生成响应的时间')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for (route, family), counts in sorted(total.latency.items()):
+            labels = f'route="{_label(route)}",family="{family}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {total.latency_sum[(route, family)]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        for name, help_text, values in (
+                ('http_request_bytes_total', '收到的请求字节数', total.bytes_in),
+                ('http_response_bytes_total', '发出的响应字节数', total.bytes_out),
+                ('http_connections_total', '接受的连接数', total.opened),
+                ('http_connections_shed_total', '超过准入上限、直接返回503的连接数', total.shed)):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for family, value in sorted(values.items()):
+                lines.append(f'{name}{{family="{family}"}} {value}')
+
+        lines.append('# HELP http_connections_reaped_total 因超时被关闭的连接数')
+        lines.append('# TYPE http_connections_reaped_total counter')
+        for phase, value in sorted(total.reaped.items()):
+            lines.append(f'http_connections_reaped_total{{phase="{phase}"}} {value}')
+
+        lines.append('# HELP http_connections_active 当前打开的连接数')
+        lines.append('# TYPE http_connections_active gauge')
+        for family in sorted(set(total.opened) | set(total.closed)):
+            active = total.opened.get(family, 0) - total.closed.get(family, 0)
+            lines.append(f'http_connections_active{{family="{family}"}} {active}')
+
+        for name, (help_text, value) in sorted(self.gauges().items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+def _quantile_ms(counts, fraction):
+    """按桶估计分位数（取所在桶的上界），落在 +Inf 桶时返回 None"""
+    total = sum(counts)
+    if not total:
+        return None
+    target = fraction * total
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, counts):
+        cumulative += count
+        if cumulative >= target:
+            return round(bound * 1000, 3)
+    return None
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 所有服务器共享的指标
+metrics = Metrics()
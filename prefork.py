@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import os
+import signal
+import sys
+import time
+
+# 子进程启动后这么短时间内退出视为启动失败，重启前先等待
+MIN_UPTIME = 1.0
+RESTART_DELAY = 1.0
+# 同一个位置连续启动失败这么多次后不再重启
+MAX_FAST_FAILURES = 5
+
+def default_processes():
+    """默认进程数：CPU核心数"""
+    return os.cpu_count() or 1
+
+def describe_status(status):
+    """把 os.waitpid 返回的状态转成可读的描述"""
+    if os.WIFSIGNALED(status):
+        return f"signal {os.WTERMSIG(status)}"
+    return f"exit {os.WEXITSTATUS(status)}"
+
+class PreforkSupervisor:
+    """预派生多进程监督者
+
+    父进程 fork 出 N 个工作进程，每个进程运行 target()。监听socket
+    可以由父进程提前绑定后被子进程继承，也可以由每个子进程用
+    SO_REUSEPORT 各自绑定，由内核在进程间分配连接。子进程异常退出时
+    自动重启，停止时汇总所有子进程的退出状态。
+    """
+
+    def __init__(self, target, processes=None):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("当前系统不支持 fork，无法使用预派生模式")
+        self.target = target
+        self.processes = processes or default_processes()
+        self.children = {}
+        self.fast_failures = {}
+        self.exit_counts = {}
+        self.restarts = 0
+        self._stopping = False
+
+    def run(self):
+        """启动所有子进程并监督它们，返回汇总后的退出码"""
+        previous = {
+            sig: signal.signal(sig, self._handle_stop)
+            for sig in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            for slot in range(self.processes):
+                self._spawn(slot)
+            print(f"预派生模式: 主进程 {os.getpid()}，{self.processes} 个工作进程")
+            while self.children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                self._reap(pid, status)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        return self.report()
+
+    def report(self):
+        """打印退出状态汇总，有子进程异常退出时返回1"""
+        summary = ', '.join(f"{name}: {count}" for name, count in sorted(self.exit_counts.items()))
+        print(f"工作进程退出汇总: {summary or '无'}，重启次数: {self.restarts}")
+        abnormal = [name for name in self.exit_counts
+                    if name not in ('exit 0', f"signal {signal.SIGTERM}", f"signal {signal.SIGINT}")]
+        return 1 if abnormal else 0
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            # 子进程：SIGTERM/SIGINT 都转成 KeyboardInterrupt，让服务器正常收尾
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            code = 0
+            try:
+                self.target()
+            except KeyboardInterrupt:
+                pass
+            except BaseException as e:
+                print(f"工作进程 {os.getpid()} 异常退出: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = (slot, time.monotonic())
+
+    def _reap(self, pid, status):
+        info = self.children.pop(pid, None)
+        if info is None:
+            return
+        slot, started = info
+        name = describe_status(status)
+        self.exit_counts[name] = self.exit_counts.get(name, 0) + 1
+        if self._stopping:
+            return
+        if time.monotonic() - started < MIN_UPTIME:
+            failures = self.fast_failures.get(slot, 0) + 1
+            self.fast_failures[slot] = failures
+            if failures >= MAX_FAST_FAILURES:
+                print(f"工作进程 {pid} 连续 {failures} 次启动后立即退出 ({name})，不再重启")
+                return
+            time.sleep(RESTART_DELAY)
+            # 等待期间收到停止信号时不再重启，否则新进程收不到 SIGTERM，主进程一直等它退出
+            if self._stopping:
+                return
+        else:
+            self.fast_failures[slot] = 0
+        print(f"工作进程 {pid} 已退出 ({name})，正在重启...")
+        self.restarts += 1
+        self._spawn(slot)
+
+    def _handle_stop(self, signum, frame):
+        if self._stopping:
+            return
+        self._stopping = True
+        print("\n正在停止所有工作进程...")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
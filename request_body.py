@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+from http_parser import HTTPParseError, MAX_BODY_SIZE, MAX_CHUNK_LINE, parse_chunk_size
+
+# 每次从socket读取请求体的最大字节数
+BODY_CHUNK = 64 * 1024
+
+# 客户端带 Expect: 100-continue 时，确认要读请求体后才发送
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+class BodyReader:
+    """从阻塞的 rfile 中按块读取请求体
+
+    支持 Content-Length 和分块传输编码（chunked）；每次最多读 chunk_size
+    字节，用 read1 只做一次底层读取，不会为了凑满一块而等待。累计长度
+    超过 max_size 时抛出 HTTPParseError(413)，声明的 Content-Length 超过
+    上限时在构造时就抛出，不读任何数据。max_size 为 None 时不限制总长度
+    （流式处理的请求体由读请求体的期限限制时间）。
+    """
+
+    def __init__(self, rfile, headers, max_size=MAX_BODY_SIZE, chunk_size=BODY_CHUNK):
+        self.rfile = rfile
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        # 已读取的请求体字节数，以及线路上的字节数（含分块编码的开销）
+        self.length = 0
+        self.size = 0
+        self.chunked = False
+        self._remaining = 0
+        self._done = False
+
+        transfer_encoding = headers.get('transfer-encoding', '').lower()
+        if transfer_encoding:
+            if transfer_encoding != 'chunked':
+                raise HTTPParseError(400, f"不支持的传输编码: {transfer_encoding}")
+            self.chunked = True
+            return
+        length_text = headers.get('content-length', '0').strip()
+        if not length_text.isdigit():
+            raise HTTPParseError(400, "Content-Length 格式错误")
+        self._remaining = int(length_text)
+        if max_size is not None and self._remaining > max_size:
+            raise HTTPParseError(413, "请求体过大")
+        self._done = self._remaining == 0
+
+    @property
+    def done(self):
+        """请求体是否已经读完（连接可以继续处理下一个请求）"""
+        return self._done
+
+    def read_chunk(self):
+        """读取下一块数据，读完时返回 b''，连接提前断开时抛出 HTTPParseError(400)"""
+        if self._done:
+            return b''
+        if self.chunked and not self._remaining:
+            self._remaining = self._read_chunk_size()
+            if not self._remaining:
+                self._read_trailer()
+                self._done = True
+                return b''
+        data = self.rfile.read1(min(self._remaining, self.chunk_size))
+        if not data:
+            raise HTTPParseError(400, "请求体不完整")
+        self._remaining -= len(data)
+        self.length += len(data)
+        self.size += len(data)
+        if self.max_size is not None and self.length > self.max_size:
+            raise HTTPParseError(413, "请求体过大")
+        if not self._remaining:
+            if self.chunked:
+                if self._read_line() != b'':
+                    raise HTTPParseError(400, "分块数据格式错误")
+            else:
+                self._done = True
+        return data
+
+    def read(self):
+        """读取完整的请求体（总长度受 max_size 限制）"""
+        chunks = []
+        while True:
+            data = self.read_chunk()
+            if not data:
+                return b''.join(chunks)
+            chunks.append(data)
+
+    def line_batches(self, max_line=MAX_BODY_SIZE):
+        """按行（NDJSON 等）逐批返回请求体
+
+        每读到一块数据就返回其中已经完整的行（不含换行符，跳过空行），
+        内存里最多保留一块数据和一个未完成的行；单行超过 max_line 时抛出
+        HTTPParseError(413)。
+        """
+        pending = b''
+        while True:
+            data = self.read_chunk()
+            if not data:
+                break
+            data = pending + data
+            end = data.rfind(b'\n') + 1
+            pending = data[end:]
+            if len(pending) > max_line:
+                raise HTTPParseError(413, "单行数据过长")
+            lines = [line for line in data[:end].split(b'\n') if line.strip()]
+            if lines:
+                yield lines
+        if pending.strip():
+            yield [pending]
+
+    def _read_chunk_size(self):
+        # 和 RequestParser 共用同一个严格的块大小解析
+        return parse_chunk_size(self._read_line())
+
+    def _read_trailer(self):
+        trailer_size = 0
+        while True:
+            line = self._read_line()
+            if not line:
+                return
+            trailer_size += len(line)
+            if trailer_size > MAX_CHUNK_LINE:
+                raise HTTPParseError(431, "尾部字段过大")
+
+    def _read_line(self):
+        line = self.rfile.readline(MAX_CHUNK_LINE + 1)
+        if not line.endswith(b'\n'):
+            if len(line) > MAX_CHUNK_LINE:
+                raise HTTPParseError(400, "分块行过长")
+            raise HTTPParseError(400, "请求体不完整")
+        self.size += len(line)
+        return line.rstrip(b'\r\n')
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+from http import HTTPStatus
+
+# 匹配任意方法的路由
+ANY_METHOD = '*'
+
+# 已生成过的状态行缓存
+STATUS_LINES = {}
+
+def status_line(status):
+    """生成状态行，例如 'HTTP/1.1 200 OK\\r\\n'"""
+    line = STATUS_LINES.get(status)
+    if line is None:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = 'Unknown'
+        line = STATUS_LINES[status] = f"HTTP/1.1 {status} {reason}\r\n"
+    return line
+
+class Response:
+    """处理函数的返回值：状态码、响应体和内容类型一起返回
+
+    body 可以是 bytes，也可以是字节段列表（例如模板渲染出的静态段和动态值），
+    分段的响应体发送时直接交给 sendmsg，只有需要完整内容时才拼接。
+    etag 可以由处理函数预先算好（例如常量响应体）；cache 是路由声明的
+    CachePolicy，由 Router 在分发时填入。head 是预先序列化好的状态行和
+    响应头（见 response_head），修改状态码、响应体或响应头时必须清空。
+    chunks 不为空时响应体由这个迭代器逐块生成（见 StreamingResponse）。
+    """
+    __slots__ = ('status', '_body', 'parts', 'content_type', 'headers', 'etag', 'cache', 'head', 'chunks')
+
+    def __init__(self, status, body, content_type='text/html; charset=utf-8', headers=None, etag=None, head=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or []
+        self.etag = etag
+        self.cache = None
+        self.head = head
+        self.chunks = None
+
+    @property
+    def body(self):
+        """完整的响应体，分段时在第一次访问时拼接"""
+        if self._body is None:
+            self._body = b''.join(self.parts)
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        if isinstance(value, list):
+            self._body = None
+            self.parts = value
+        else:
+            self._body = value
+            self.parts = None
+
+    @property
+    def length(self):
+        """响应体长度，不需要拼接分段"""
+        if self._body is not None:
+            return len(self._body)
+        return sum(len(part) for part in self.parts)
+
+    def body_parts(self):
+        """响应体的字节段列表"""
+        if self._body is not None:
+            return [self._body]
+        return self.parts
+
+    def head_bytes(self):
+        """编码好的状态行和响应头，有预先生成的就直接使用"""
+        if self.head is not None:
+            return self.head
+        return response_head(self).encode('utf-8')
+
+class StreamingResponse(Response):
+    """长度事先未知的响应：chunks 迭代器每产生一段就作为一个分块发出
+
+    用于边读请求体边回复的接口（例如逐条处理的 NDJSON），只有
+    server.py 的处理器支持；空的段会被跳过。
+    """
+    __slots__ = ()
+
+    def __init__(self, status, chunks, content_type, headers=None):
+        super().__init__(status, b'', content_type, headers)
+        self.chunks = chunks
+
+def response_head(response):
+    """状态行、Content-Type/Content-Length（流式响应为 Transfer-Encoding）和响应自带的头
+
+    不包含 Connection/Date/Server 和结尾的空行，这些由服务器在发送时追加。
+    """
+    head = status_line(response.status)
+    if response.chunks is not None:
+        head += f"Content-Type: {response.content_type}\r\nTransfer-Encoding: chunked\r\n"
+    elif response.status != 304 and response.status >= 200:
+        # 304 和 1xx（例如 101 协议切换）没有响应体，不发送 Content-Type/Content-Length
+        head += f"Content-Type: {response.content_type}\r\nContent-Length: {response.length}\r\n"
+    return head + ''.join(f"{name}: {value}\r\n" for name, value in response.headers)
+
+class _Node:
+    """前缀树节点，用于带参数和前缀匹配的路由"""
+    __slots__ = ('children', 'param', 'param_name', 'handlers', 'prefix_handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.param_name = None
+        self.handlers = {}
+        self.prefix_handlers = {}
+
+class Router:
+    """路由表
+
+    固定路径按 (method, path) 存在字典里，一次查找即可分发；
+    带参数 ('/user/{name}') 或前缀 ('/static/*') 的路由放在一棵小前缀树里，
+    只有固定路径没命中时才会查它。
+    """
+
+    def __init__(self, not_found=None):
+        self.not_found = not_found
+        self._exact = {}
+        self._root = _Node()
+        self._has_tree = False
+        self._cache_policies = {}
+        self._route_names = {}
+
+    def add(self, method, path, handler, cache=None):
+        """注册路由，method 为 '*' 时匹配任意方法，cache 为该路由的 CachePolicy"""
+        if cache is not None:
+            self._cache_policies[handler] = cache
+        # 指标里按注册的路由模式（而不是实际路径）统计
+        self._route_names.setdefault(handler, path)
+        if '{' not in path and not path.endswith('*'):
+            self._exact[(method, path)] = handler
+            return handler
+
+        node = self._root
+        segments = [segment for segment in path.split('/') if segment]
+        for i, segment in enumerate(segments):
+            if segment == '*':
+                if i != len(segments) - 1:
+                    raise ValueError(f"'*' 只能出现在路由末尾: {path}")
+                node.prefix_handlers[method] = handler
+                self._has_tree = True
+                return handler
+            if segment.startswith('{') and segment.endswith('}'):
+                name = segment[1:-1]
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(f"同一位置的参数名不一致: {path}")
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.handlers[method] = handler
+        self._has_tree = True
+        return handler
+
+    def route(self, method, path, cache=None):
+        """装饰器形式的 add()"""
+        def decorator(handler):
+            return self.add(method, path, handler, cache)
+        return decorator
+
+    def resolve(self, method, path):
+        """查找处理函数，返回 (handler, params)，没有匹配时 handler 为 None
+
+        HEAD 没有单独注册时使用 GET 的处理函数（服务器只发响应头）。
+        """
+        path = path.split('?', 1)[0]
+        handler = self._exact.get((method, path)) or self._exact.get((ANY_METHOD, path))
+        if handler is not None:
+            return handler, {}
+        if self._has_tree:
+            handler, params = self._search(method, path)
+            if handler is not None:
+                return handler, params
+        if method == 'HEAD':
+            return self.resolve('GET', path)
+        return None, {}
+
+    def dispatch(self, request):
+        """分发请求，返回处理函数生成的 Response"""
+        handler, params = self.resolve(request.method, request.path)
+        request.params = params
+        if handler is None:
+            handler = self.not_found
+        return self.call(handler, request)
+
+    def call(self, handler, request):
+        """调用处理函数，并附上路由声明的缓存策略"""
+        request.route = self.route_name(handler)
+        response = handler(request)
+        if response.cache is None:
+            response.cache = self._cache_policies.get(handler)
+        return response
+
+    def route_name(self, handler):
+        """处理函数注册时的路由模式，未注册的（例如 not_found）用函数名"""
+        return self._route_names.get(handler) or getattr(handler, '__name__', 'unknown')
+
+    def _search(self, method, path):
+        segments = [segment for segment in path.split('/') if segment]
+        node = self._root
+        params = {}
+        prefix_match = None
+        for i, segment in enumerate(segments):
+            handler = _pick(node.prefix_handlers, method)
+            if handler is not None:
+                prefix_match = (handler, dict(params, path='/'.join(segments[i:])))
+            child = node.children.get(segment)
+            if child is None and node.param is not None:
+                params[node.param_name] = segment
+                child = node.param
+            if child is None:
+                return prefix_match or (None, {})
+            node = child
+        handler = _pick(node.handlers, method)
+        if handler is not None:
+            return handler, params
+        handler = _pick(node.prefix_handlers, method)
+        if handler is not None:
+            return handler, dict(params, path='')
+        return prefix_match or (None, {})
+
+def _pick(handlers, method):
+    if not handlers:
+        return None
+    return handlers.get(method) or handlers.get(ANY_METHOD)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+import selectors
+
+from listener import accept_batch
+from metrics import metrics
+from admission import shed_connection
+from deadlines import Timeouts, TimerWheel, REQUEST_TIMEOUT, discard_output
+from vectored import as_views, send_some, close_regions
+from http_parser import RequestParser, HTTPParseError, build_error_response
+
+INTERNAL_ERROR = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# 输出缓冲超过这个大小时暂停读取新的管线化请求
+MAX_PENDING_OUTPUT = 256 * 1024
+
+class Connection:
+    """事件循环中一个客户端连接的状态
+
+    output 是待发送缓冲区的 memoryview（或 FileRegion）列表，响应的各个
+    字节段原样排队，写出时用 sendmsg/sendfile 提交，部分写入只切片不复制；
+    pending 是其中尚未发送的字节数；deadline 是它在时间轮上的期限；
+    upgrade 不为空时，输出写完后把连接交给它（事件流、WebSocket）。
+    """
+    __slots__ = ('sock', 'client_ip', 'parser', 'output', 'pending', 'served', 'closing', 'deadline', 'upgrade')
+
+    def __init__(self, sock, client_ip):
+        self.sock = sock
+        self.client_ip = client_ip
+        self.parser = RequestParser()
+        self.output = []
+        self.pending = 0
+        self.served = 0
+        self.closing = False
+        self.deadline = None
+        self.upgrade = None
+
+class SelectorServer:
+    """单个 selectors 事件循环
+
+    所有监听socket（任意数量的端口，IPv4/IPv6）和客户端连接都注册在
+    同一个 epoll 实例上，accept、读请求、写响应都在一个线程里完成。
+    设置了 on_accept 时，新连接整批交给 on_accept（例如线程池），
+    事件循环只负责accept。连接的读请求头/请求体、空闲和写响应期限
+    放在时间轮上，由事件循环每次唤醒时检查。打开的连接数达到
+    max_connections 时，新连接在accept之后直接收到503并被关闭。
+    """
+
+    def __init__(self, build_response, timeouts=None, max_requests=100, on_accept=None, max_connections=None):
+        self.build_response = build_response
+        self.timeouts = timeouts or Timeouts()
+        self.wheel = TimerWheel()
+        self.max_requests = max_requests
+        self.on_accept = on_accept
+        self.max_connections = max_connections
+        self.selector = selectors.DefaultSelector()
+        self.listeners = []
+        self.connections = {}
+
+    def add_listener(self, server_socket):
+        """注册一个监听socket"""
+        server_socket.setblocking(False)
+        self.selector.register(server_socket, selectors.EVENT_READ, None)
+        self.listeners.append(server_socket)
+
+    def serve_forever(self):
+        """运行事件循环，直到被 Ctrl+C 中断"""
+        try:
+            while True:
+                for key, events in self.selector.select(timeout=self.wheel.resolution):
+                    if key.data is None:
+                        self._accept(key.fileobj)
+                    else:
+                        conn = key.data
+                        if events & selectors.EVENT_READ:
+                            self._on_readable(conn)
+                        if events & selectors.EVENT_WRITE and conn.sock.fileno() != -1:
+                            self._flush(conn)
+                self.wheel.expire()
+        finally:
+            for conn in list(self.connections.values()):
+                self._close(conn)
+            for server_socket in self.listeners:
+                try:
+                    self.selector.unregister(server_socket)
+                except (KeyError, ValueError):
+                    pass
+            self.selector.close()
+
+    def _accept(self, server_socket):
+        try:
+            batch = accept_batch(server_socket)
+        except OSError as e:
+            print(f"接受连接时出错: {e}")
+            return
+        if self.on_accept is not None:
+            self.on_accept(batch)
+            return
+        for client_socket, client_address in batch:
+            if self.max_connections is not None and len(self.connections) >= self.max_connections:
+                shed_connection(client_socket, client_address)
+                continue
+            client_socket.setblocking(False)
+            conn = Connection(client_socket, client_address[0])
+            conn.deadline = self.wheel.deadline(self.timeouts, self._reap, 'header', conn)
+            self.connections[client_socket.fileno()] = conn
+            metrics.connection_opened(conn.client_ip)
+            self.selector.register(client_socket, selectors.EVENT_READ, conn)
+
+    def _on_readable(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(conn)
+            return
+        if not data:
+            self._close(conn)
+            return
+
+        try:
+            requests = conn.parser.feed(data)
+        except HTTPParseError as e:
+            self._queue(conn, [build_error_response(e.status)])
+            conn.closing = True
+            self._flush(conn)
+            return
+
+        # 按顺序生成管线化请求的响应，写响应的期限从这里开始
+        if requests:
+            conn.deadline.set('write')
+        try:
+            for request in requests:
+                conn.served += 1
+                request.client_ip = conn.client_ip
+                keep_alive = request.keep_alive and conn.served < self.max_requests
+                self._queue(conn, self.build_response(request, keep_alive))
+                if request.upgrade is not None:
+                    conn.upgrade = request.upgrade
+                    conn.closing = True
+                    break
+                if not keep_alive:
+                    conn.closing = True
+                    break
+        except Exception as e:
+            print(f"处理请求时出错: {e}")
+            self._queue(conn, [INTERNAL_ERROR])
+            conn.closing = True
+        if not conn.closing and conn.parser.error is not None:
+            # 同一批数据里格式错误的请求：排在前面请求的响应之后
+            self._queue(conn, [build_error_response(conn.parser.error.status)])
+            conn.closing = True
+        if conn.output:
+            self._flush(conn)
+        else:
+            conn.deadline.set(conn.parser.phase)
+
+    def _queue(self, conn, buffers):
+        views = as_views(buffers)
+        conn.output.extend(views)
+        conn.pending += sum(len(view) for view in views)
+
+    def _flush(self, conn):
+        """尽量把输出缓冲写进内核，写不完时等待可写事件"""
+        try:
+            while conn.output:
+                conn.pending -= send_some(conn.sock, conn.output)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._close(conn)
+            return
+
+        if not conn.output:
+            if conn.closing:
+                self._close(conn, hand_off=conn.upgrade is not None)
+            else:
+                conn.deadline.set(conn.parser.phase)
+                self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+            return
+        conn.deadline.set('write')
+        if conn.pending > MAX_PENDING_OUTPUT or conn.closing:
+            # 输出积压时先不读新请求
+            self.selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+        else:
+            self.selector.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+
+    def _reap(self, deadline):
+        """期限到了：读请求阶段先尽量发出408，然后关闭连接"""
+        conn = deadline.data
+        if deadline.phase in ('header', 'body') and not conn.output:
+            try:
+                conn.sock.send(REQUEST_TIMEOUT)
+            except OSError:
+                pass
+        elif deadline.phase == 'write':
+            discard_output(conn.sock)
+        self._close(conn)
+
+    def _close(self, conn, hand_off=False):
+        """关闭连接；hand_off 为真时不关闭socket，交给 conn.upgrade"""
+        fileno = conn.sock.fileno()
+        if fileno == -1:
+            return
+        conn.deadline.cancel()
+        close_regions(conn.output)
+        conn.output = []
+        self.connections.pop(fileno, None)
+        metrics.connection_closed(conn.client_ip)
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        if hand_off:
+            conn.upgrade(conn.sock)
+            return
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
@@ -1,21 +1,81 @@
 #!/usr/bin/env python3
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+import argparse
+import os
+import html
 import json
 import urllib.parse
-from datetime import datetime
 import socket
 import sys
+import time
 
-class SimpleHTTPHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        client_ip = self.client_address[0]
-        print(f"GET请求来自客户端: {client_ip} -> {self.path}")
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
-            html_content = """
+from access_log import AccessLog
+from clock import clock, per_second
+from compression import negotiate, compress_response, encoding_headers, MIN_SIZE
+from caching import CachePolicy, apply_cache_policy
+from http_parser import HTTPRequest, HTTPParseError, MAX_BODY_SIZE
+from request_body import BodyReader, CONTINUE_RESPONSE
+from batch import Batch, MAX_BATCH_REQUESTS
+from routes import Router, Response, StreamingResponse
+from sse import event_stream, TIME_CHANNEL
+from templates import Template, JSONTemplate
+from json_response import ConstantJSON, dump_json
+from metrics import metrics, PROMETHEUS_TYPE
+from deadlines import Timeouts, timer_wheel, reap_socket, HEADER_TIMEOUT, BODY_TIMEOUT, WRITE_TIMEOUT
+from vectored import send_buffers
+from static_files import StaticFiles
+from worker_pool import WorkerPool, OVERFLOW_POLICIES
+
+# /static/ 路由对应的目录，可用 --static-dir 修改
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+static_files = StaticFiles(STATIC_DIR)
+
+# 访问日志：请求线程只入队，由后台线程写出
+access_log = AccessLog()
+
+# JSON等动态响应超过这个大小才压缩
+COMPRESS_MIN_SIZE = MIN_SIZE
+
+# 缓冲读取的请求体上限（也是流式 NDJSON 单条记录的上限），超过时返回413
+MAX_REQUEST_BODY = MAX_BODY_SIZE
+
+# 这些类型的请求体不预先读入内存，由处理函数边读边处理
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+NDJSON_TYPE = 'application/x-ndjson'
+
+# 连接各阶段的期限（idle 即 keep-alive 空闲超时），由 run_server 按参数重新生成
+TIMEOUTS = Timeouts(idle=30)
+
+# API 响应统一带上的跨域头
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+]
+
+def json_response(data, status=200):
+    """生成JSON响应"""
+    return Response(status, dump_json(data), 'application/json', CORS_HEADERS)
+
+# 常量响应可以被浏览器和中间代理缓存一分钟
+CONSTANT_CACHE = CachePolicy(max_age=60)
+# 测试页面带有当前时间和客户端IP：只允许浏览器缓存，每次都用弱 ETag 重新验证
+PAGE_CACHE = CachePolicy(private=True, no_cache=True, weak=True)
+NO_STORE = CachePolicy(no_store=True)
+
+# 常量响应：响应体、ETag 和响应头在启动时一次生成
+HELLO_RESPONSE = ConstantJSON({'message': 'Hello, World!', 'status': 'success'},
+                              content_type='application/json', headers=CORS_HEADERS, cache=CONSTANT_CACHE)
+# 状态接口带有运行指标摘要，每次生成
+STATUS_JSON = JSONTemplate('{"server": "Python HTTP Server", "status": "running", "version": "1.0.0", "metrics": {{metrics|raw}}}')
+TIME_JSON = JSONTemplate('{"current_time": "{{current_time}}", "timestamp": {{timestamp|raw}}}')
+
+# 路由表：按 (method, path) 一次字典查找
+router = Router()
+
+# 测试页面：静态部分在启动时编码并预压缩
+INDEX_PAGE = Template("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -33,14 +93,15 @@ class SimpleHTTPHandler(BaseHTTPRequestHandler):
 <body>
     <div class="container">
         <h1>Python HTTP 服务器测试页面</h1>
-        <p>服务器运行时间: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + """</p>
-        <p>您的客户端IP: """ + client_ip + """</p>
+        <p>服务器运行时间: {{current_time}}</p>
+        <p>您的客户端IP: {{client_ip}}</p>
         
         <div class="api-test">
             <h2>API 测试</h2>
             <button onclick="testAPI('/api/hello')">测试 Hello API</button>
             <button onclick="testAPI('/api/time')">获取服务器时间</button>
             <button onclick="testAPI('/api/status')">服务器状态</button>
+            <button onclick="testBatch()">一次请求全部</button>
             <div id="result" class="result" style="display:none;"></div>
         </div>
         
@@ -66,6 +127,28 @@ class SimpleHTTPHandler(BaseHTTPRequestHandler):
                 });
         }
         
+        function testBatch() {
+            // 三个接口合并成一个 /api/batch 请求，只需一次往返
+            fetch('/api/batch', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({parallel: true, requests: [
+                    {method: 'GET', path: '/api/hello'},
+                    {method: 'GET', path: '/api/time'},
+                    {method: 'GET', path: '/api/status'}
+                ]})
+            })
+            .then(response => response.json())
+            .then(data => {
+                document.getElementById('result').style.display = 'block';
+                document.getElementById('result').innerHTML = '<strong>响应:</strong><br>' + JSON.stringify(data, null, 2);
+            })
+            .catch(error => {
+                document.getElementById('result').style.display = 'block';
+                document.getElementById('result').innerHTML = '<strong>错误:</strong> ' + error;
+            });
+        }
+        
         function testPOST() {
             const name = document.getElementById('nameInput').value;
             fetch('/api/greet', {
@@ -86,59 +169,275 @@ class SimpleHTTPHandler(BaseHTTPRequestHandler):
     </script>
 </body>
 </html>
-            """
-            self.wfile.write(html_content.encode('utf-8'))
-            
-        elif self.path == '/api/hello':
-            self.send_json_response({'message': 'Hello, World!', 'status': 'success'})
-            
-        elif self.path == '/api/time':
-            self.send_json_response({
-                'current_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'timestamp': datetime.now().timestamp()
-            })
-            
-        elif self.path == '/api/status':
-            self.send_json_response({
-                'server': 'Python HTTP Server',
-                'status': 'running',
-                'version': '1.0.0'
-            })
-            
-        else:
-            self.send_error(404, 'Page not found')
+            """)
+
+@router.route('GET', '/', cache=PAGE_CACHE)
+def index(request):
+    """测试页面"""
+    encoding = negotiate(request.headers.get('accept-encoding'))
+    content = INDEX_PAGE.render_parts(encoding, current_time=clock.now_str(), client_ip=request.client_ip)
+    return Response(200, content, 'text/html', encoding_headers(encoding))
+
+@router.route('GET', '/api/hello')
+def api_hello(request):
+    return HELLO_RESPONSE.response()
+
+@router.route('GET', '/api/time', cache=NO_STORE)
+def api_time(request):
+    timestamp, current_time = clock.now()
+    content = TIME_JSON.render(current_time=current_time, timestamp=timestamp)
+    return Response(200, content, 'application/json', CORS_HEADERS)
+
+@router.route('GET', '/api/time/stream', cache=NO_STORE)
+def api_time_stream(request):
+    """每秒推送一次服务器时间（Server-Sent Events），代替轮询 /api/time"""
+    return event_stream(request, TIME_CHANNEL, CORS_HEADERS)
+
+# 合并所有分片的指标摘要每秒只算一次
+status_body = per_second(lambda: STATUS_JSON.render(metrics=dump_json(metrics.summary()).decode('utf-8')))
+
+@router.route('GET', '/api/status', cache=NO_STORE)
+def api_status(request):
+    return Response(200, status_body(), 'application/json', CORS_HEADERS)
+
+@router.route('GET', '/api/metrics', cache=NO_STORE)
+def api_metrics(request):
+    """Prometheus 格式的指标"""
+    return Response(200, metrics.prometheus().encode('utf-8'), PROMETHEUS_TYPE)
+
+# 批量接口：多个子请求在进程内分发给同一个路由表，结果合并成一个JSON响应
+batch = router.add('POST', '/api/batch', Batch(router), cache=NO_STORE)
+
+@router.route('GET', '/static/*')
+def static(request):
+    """静态文件"""
+    return static_files.serve(request) or not_found_response('File not found')
+
+def greet_record(line):
+    """NDJSON 中的一条记录 -> 一行问候（格式错误的记录回复一行错误）"""
+    try:
+        data = json.loads(line)
+    except (UnicodeDecodeError, ValueError):
+        return dump_json({'error': 'Invalid JSON'}) + b'\n'
+    if not isinstance(data, dict):
+        return dump_json({'error': 'Record must be an object'}) + b'\n'
+    name = data.get('name', 'Anonymous')
+    return dump_json({'greeting': f'你好, {name}!', 'received_data': data, 'timestamp': clock.now_str()}) + b'\n'
+
+def greet_stream(body):
+    """每读到一批完整的记录就回复一段，内存占用与请求体总长度无关"""
+    try:
+        for lines in body.line_batches(MAX_REQUEST_BODY):
+            yield b''.join(greet_record(line) for line in lines)
+    except HTTPParseError as e:
+        # 响应头已经发出，只能在流的末尾报告错误
+        yield dump_json({'error': str(e), 'status': e.status}) + b'\n'
+
+@router.route('POST', '/api/greet')
+def api_greet(request):
+    if request.stream is not None:
+        # NDJSON：一行一个 {"name": ...}，逐条回复
+        return StreamingResponse(200, greet_stream(request.stream), NDJSON_TYPE, CORS_HEADERS)
+    # 和 NDJSON 的逐条处理一样校验：不是有效的UTF-8/JSON、不是对象都回复400
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return json_response({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return json_response({'error': 'Request body must be an object'}, status=400)
+    name = data.get('name', 'Anonymous')
+    
+    response = {
+        'greeting': f'你好, {name}!',
+        'received_data': data,
+        'timestamp': clock.now_str()
+    }
+    return json_response(response)
+
+def not_found_response(message):
+    """和 send_error 格式相同的 404 页面"""
+    body = BaseHTTPRequestHandler.error_message_format % {
+        'code': 404,
+        'message': html.escape(message, quote=False),
+        'explain': 'Nothing matches the given URI',
+    }
+    return Response(404, body.encode('utf-8', 'replace'), BaseHTTPRequestHandler.error_content_type)
+
+class SimpleHTTPHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keep-alive：每个响应都必须带 Content-Length
+    protocol_version = 'HTTP/1.1'
+    # 不用socket超时：读请求头/请求体、空闲和写响应的期限由共享的时间轮检查，
+    # 超时后它关闭socket，阻塞中的读写随之返回
+    timeout = None
+    
+    def setup(self):
+        super().setup()
+        self.deadline = timer_wheel.deadline(TIMEOUTS, reap_socket, 'header', self.connection)
+        metrics.connection_opened(self.client_address[0])
+    
+    def finish(self):
+        try:
+            self.deadline.cancel()
+            super().finish()
+        finally:
+            metrics.connection_closed(self.client_address[0])
+    
+    def handle_one_request(self):
+        # 等到下一个请求的第一个字节后才开始计算读请求头的期限，之前算空闲
+        try:
+            if not self.rfile.peek(1):
+                self.close_connection = True
+                return
+        except OSError:
+            self.close_connection = True
+            return
+        self.deadline.set('header')
+        self.expect_continue = False
+        try:
+            super().handle_one_request()
+        except OSError:
+            # 被时间轮关闭的连接上读写出错是预期的
+            if not self.deadline.expired:
+                raise
+            self.close_connection = True
+            return
+        self.deadline.set('idle')
+    
+    def handle_expect_100(self):
+        # 推迟到确认要读请求体（路由存在、长度没有超限）时再发送 100 Continue
+        self.expect_continue = True
+        return True
+    
+    def do_GET(self):
+        self.dispatch('Page not found')
     
     def do_POST(self):
-        client_ip = self.client_address[0]
-        print(f"POST请求来自客户端: {client_ip} -> {self.path}")
-        if self.path == '/api/greet':
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length)
-            
-            try:
-                data = json.loads(post_data.decode('utf-8'))
-                name = data.get('name', 'Anonymous')
-                
-                response = {
-                    'greeting': f'你好, {name}!',
-                    'received_data': data,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                self.send_json_response(response)
-                
-            except json.JSONDecodeError:
-                self.send_json_response({'error': 'Invalid JSON'}, status=400)
+        self.dispatch('API endpoint not found')
+    
+    def date_time_string(self, timestamp=None):
+        # Date 头使用共享时钟缓存的字符串
+        if timestamp is None:
+            return clock.http_date()
+        return super().date_time_string(timestamp)
+    
+    def log_request(self, code='-', size='-'):
+        # 替代默认的 stderr 输出，写入异步访问日志（请求行解析失败时还没有 path）
+        access_log.log(self.command, getattr(self, 'path', '-'), self.client_address[0], code, size)
+    
+    def log_message(self, format, *args):
+        access_log.message(f"{self.client_address[0]} {format % args}")
+    
+    def dispatch(self, not_found_message):
+        """通过路由表分发请求
+
+        请求体按块读取并限制总长度；NDJSON 请求体不预先读入，交给处理函数
+        边读边回复。带 Expect: 100-continue 的请求在确认要读请求体时才发送
+        100 Continue，不读请求体就回复的请求随后关闭连接。
+        """
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        handler, params = router.resolve(self.command, self.path)
+        content_type = headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        streaming = handler is not None and content_type in NDJSON_TYPES
+        self.deadline.set('body')
+        try:
+            body = BodyReader(self.rfile, headers, None if streaming else MAX_REQUEST_BODY)
+            if handler is None and self.expect_continue and not body.done:
+                # 客户端还在等 100 Continue，不必读请求体
+                self.close_connection = True
+            elif not body.done:
+                if self.expect_continue:
+                    self.connection.sendall(CONTINUE_RESPONSE)
+                if not streaming:
+                    body = body.read()
+        except HTTPParseError as e:
+            self.close_connection = True
+            if self.deadline.expired:
+                # 客户端断开或读请求体超时（时间轮已经回复了408）
+                return
+            self.log_message("请求体无效 (%d): %s", e.status, e)
+            self.send_error(e.status)
+            return
+        
+        request = HTTPRequest(self.command, self.path, self.request_version, headers, b'', self.client_address[0])
+        if isinstance(body, bytes):
+            request.body = body
         else:
-            self.send_error(404, 'API endpoint not found')
+            request.stream = body
+        # 请求行和请求头已被 http.server 读走，按解析结果估算线路上的字节数
+        request.size = (len(self.raw_requestline) + len(request.body) + 2 +
+                        sum(len(name) + len(value) + 4 for name, value in self.headers.items()))
+        
+        if handler is None:
+            request.route = 'not_found'
+            self.send_routed_response(not_found_response(not_found_message), request)
+            return
+        request.params = params
+        self.send_routed_response(router.call(handler, request), request)
+        if request.stream is not None and not request.stream.done:
+            # 处理函数没有读完请求体，连接上剩下的数据无法再解析
+            self.close_connection = True
     
-    def send_json_response(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+    def send_routed_response(self, response, request=None):
+        """发送处理函数返回的 Response
+
+        状态行、响应头和响应体各段用 sendmsg 一起写出，不拼成一个大缓冲区；
+        常量响应直接使用预先生成的头。流式响应用分块编码边生成边发送。
+        """
+        upgrade = request.upgrade if request is not None else None
+        if response.chunks is not None and upgrade is None and self.request_version != 'HTTP/1.1':
+            # HTTP/1.0 不支持分块编码，只能生成完再发送
+            response.body = b''.join(response.chunks)
+            response.chunks = None
+        compress_response(response, self.headers.get('Accept-Encoding'), COMPRESS_MIN_SIZE)
+        apply_cache_policy(response, self.command, self.headers.get('If-None-Match'))
+        self.log_request(response.status, '-' if response.chunks is not None else response.length)
+        head = response.head_bytes()
+        tail = f"Server: {self.version_string()}\r\nDate: {clock.http_date()}\r\n"
+        if self.close_connection:
+            tail += "Connection: close\r\n"
+        tail = tail.encode('latin-1')
+        if upgrade is not None:
+            # 只发响应头，连接交给事件流/WebSocket 的事件循环，这个线程随后退出
+            metrics.observe(request.route, request.client_ip, response.status, time.perf_counter() - request.received,
+                            request.size, len(head) + len(tail) + 2)
+            send_buffers(self.connection, [head, tail, b'\r\n'])
+            self.close_connection = True
+            self.deadline.cancel()
+            upgrade(self.connection)
+            return
+        if response.chunks is not None:
+            self.send_chunks(response, [head, tail, b'\r\n'], request)
+            return
+        if request is not None:
+            metrics.observe(request.route, request.client_ip, response.status, time.perf_counter() - request.received,
+                            request.size, len(head) + len(tail) + 2 + response.length)
+        self.deadline.set('write')
+        send_buffers(self.connection, [head, tail, b'\r\n', *response.body_parts()])
+    
+    def send_chunks(self, response, buffers, request=None):
+        """分块发送流式响应，响应头和第一段一起写出
+
+        生成响应的同时还在读请求体，期限保持在读请求体阶段，整个交换
+        受 --body-timeout 限制。
+        """
+        sent = 0
+        for chunk in response.chunks:
+            if not chunk:
+                continue
+            buffers += [b'%x\r\n' % len(chunk), chunk, b'\r\n']
+            sent += sum(len(buffer) for buffer in buffers)
+            send_buffers(self.connection, buffers)
+            buffers = []
+        buffers.append(b'0\r\n\r\n')
+        sent += sum(len(buffer) for buffer in buffers)
+        self.deadline.set('write')
+        send_buffers(self.connection, buffers)
+        if request is not None:
+            size = request.size
+            if request.stream is not None:
+                size += request.stream.size
+            metrics.observe(request.route, request.client_ip, response.status, time.perf_counter() - request.received,
+                            size, sent)
 
 class DualStackHTTPServer(HTTPServer):
     address_family = socket.AF_INET6
@@ -157,11 +456,73 @@ class DualStackHTTPServer(HTTPServer):
                 self.server_close()
                 raise e
 
-def run_server(port=10000):
+class WorkerPoolMixIn:
+    """用固定大小的线程池处理连接（代替 ThreadingMixIn 的每个连接一个线程）"""
+    worker_pool = None
+
+    def process_request(self, request, client_address):
+        self.worker_pool.submit(request, client_address)
+
+    def process_request_pooled(self, request, client_address):
+        """在工作线程中处理一个连接"""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+
+class ThreadingDualStackHTTPServer(ThreadingMixIn, DualStackHTTPServer):
+    daemon_threads = True
+
+class ThreadingIPv4HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class PooledDualStackHTTPServer(WorkerPoolMixIn, DualStackHTTPServer):
+    pass
+
+class PooledIPv4HTTPServer(WorkerPoolMixIn, HTTPServer):
+    pass
+
+# 并发模式 -> (双栈服务器类, IPv4 回退服务器类)
+SERVER_CLASSES = {
+    'single': (DualStackHTTPServer, HTTPServer),
+    'thread': (ThreadingDualStackHTTPServer, ThreadingIPv4HTTPServer),
+    'pool': (PooledDualStackHTTPServer, PooledIPv4HTTPServer),
+}
+
+def run_server(port=10000, concurrency='thread', pool_size=16, queue_size=64,
+               overflow='block', timeout=30, compress_min_size=MIN_SIZE,
+               static_dir=STATIC_DIR, static_max_age=3600, header_timeout=HEADER_TIMEOUT,
+               body_timeout=BODY_TIMEOUT, write_timeout=WRITE_TIMEOUT, max_body_size=MAX_BODY_SIZE,
+               batch_max_requests=MAX_BATCH_REQUESTS):
+    """启动服务器
+
+    concurrency: single 单线程（旧行为）; thread 每个连接一个线程;
+    pool 固定大小线程池。timeout 为 keep-alive 连接的空闲超时（秒）。
+    compress_min_size: JSON等动态响应超过这个大小才压缩。
+    static_dir: /static/ 路由对应的目录。
+    header_timeout/body_timeout/write_timeout: 收完请求头、请求体和写完响应的期限（秒）。
+    max_body_size: 请求体（NDJSON 为单条记录）的最大字节数，超过时返回413。
+    batch_max_requests: /api/batch 一次最多包含的子请求数。
+    """
+    global COMPRESS_MIN_SIZE, TIMEOUTS, MAX_REQUEST_BODY, static_files
+    COMPRESS_MIN_SIZE = compress_min_size
+    MAX_REQUEST_BODY = max_body_size
+    TIMEOUTS = Timeouts(header_timeout, body_timeout, timeout, write_timeout)
+    static_files = StaticFiles(static_dir, static_max_age)
+    batch.max_requests = batch_max_requests
+    timer_wheel.start()
+    dual_stack_class, ipv4_class = SERVER_CLASSES[concurrency]
     try:
         # 尝试IPv6双栈服务器
         server_address = ('::', port)
-        httpd = DualStackHTTPServer(server_address, SimpleHTTPHandler)
+        httpd = dual_stack_class(server_address, SimpleHTTPHandler)
         print(f'服务器启动在所有网络接口 (IPv4 + IPv6)，端口 {port}')
         print(f'本地访问:')
         print(f'  IPv4: http://localhost:{port}/')
@@ -175,11 +536,24 @@ def run_server(port=10000):
         print(f'IPv6启动失败: {e}')
         print('回退到IPv4模式...')
         server_address = ('0.0.0.0', port)
-        httpd = HTTPServer(server_address, SimpleHTTPHandler)
+        httpd = ipv4_class(server_address, SimpleHTTPHandler)
         print(f'服务器启动在所有IPv4接口，端口 {port}')
         print(f'本地访问: http://localhost:{port}/')
         print(f'局域网访问: http://192.168.3.214:{port}/')
 
+    if concurrency == 'pool':
+        httpd.worker_pool = WorkerPool(
+            httpd.process_request_pooled,
+            size=pool_size,
+            queue_size=queue_size,
+            overflow=overflow
+        ).start()
+        metrics.add_worker_pool(httpd.worker_pool)
+        print(f'线程池模式: {pool_size} 个工作线程, 队列长度 {queue_size}, 溢出策略 {overflow}')
+    elif concurrency == 'thread':
+        print('多线程模式: 每个连接一个线程')
+    print(f'HTTP/1.1 keep-alive，空闲超时 {timeout} 秒，请求头/请求体/写响应期限 '
+          f'{header_timeout}/{body_timeout}/{write_timeout} 秒')
     print('按 Ctrl+C 停止服务器')
 
     try:
@@ -187,6 +561,41 @@ def run_server(port=10000):
     except KeyboardInterrupt:
         print('\n服务器已停止')
         httpd.server_close()
+    finally:
+        access_log.close()
+
+def parse_args():
+    """解析启动参数"""
+    parser = argparse.ArgumentParser(description='Python 双栈 HTTP 测试服务器')
+    parser.add_argument('--port', type=int, default=10000, help='监听端口')
+    parser.add_argument('--concurrency', choices=sorted(SERVER_CLASSES), default='thread',
+                        help='single: 单线程; thread: 每个连接一个线程; pool: 固定大小线程池')
+    parser.add_argument('--pool-size', type=int, default=16, help='线程池工作线程数量')
+    parser.add_argument('--queue-size', type=int, default=64, help='线程池等待队列长度')
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default='block',
+                        help='队列满时的策略: block 阻塞, shed 返回503, close 直接关闭')
+    parser.add_argument('--timeout', type=float, default=30, help='keep-alive 连接的空闲超时（秒）')
+    parser.add_argument('--header-timeout', type=float, default=HEADER_TIMEOUT,
+                        help='收完请求头的期限（秒），超时返回408')
+    parser.add_argument('--body-timeout', type=float, default=BODY_TIMEOUT,
+                        help='收完请求体的期限（秒），超时返回408')
+    parser.add_argument('--write-timeout', type=float, default=WRITE_TIMEOUT,
+                        help='写完一个响应的期限（秒）')
+    parser.add_argument('--max-body-size', type=int, default=MAX_BODY_SIZE,
+                        help='请求体（NDJSON 为单条记录）的最大字节数，超过时返回413')
+    parser.add_argument('--batch-max-requests', type=int, default=MAX_BATCH_REQUESTS,
+                        help='/api/batch 一次最多包含的子请求数，超过时返回413')
+    parser.add_argument('--static-dir', default=STATIC_DIR, help='/static/ 路由对应的目录')
+    parser.add_argument('--static-max-age', type=int, default=3600,
+                        help='静态文件的 Cache-Control max-age（秒）')
+    parser.add_argument('--compress-min-size', type=int, default=MIN_SIZE,
+                        help='JSON等动态响应超过这个大小（字节）才做gzip/deflate压缩')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    run_server()
\ No newline at end of file
+    args = parse_args()
+    run_server(args.port, args.concurrency, args.pool_size, args.queue_size,
+               args.overflow, args.timeout, args.compress_min_size,
+               args.static_dir, args.static_max_age, args.header_timeout,
+               args.body_timeout, args.write_timeout, args.max_body_size,
+               args.batch_max_requests)
\ No newline at end of file
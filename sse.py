@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+from broadcast import hub, detach_socket
+from clock import clock
+from json_response import dump_json
+from routes import StreamingResponse
+
+SSE_TYPE = 'text/event-stream'
+
+# 时间事件的频道和间隔（秒）
+TIME_CHANNEL = 'time'
+TIME_INTERVAL = 1
+
+# 客户端断线后隔多久重连（毫秒），连接建立后先发出
+SSE_PRELUDE = b'retry: 1000\n\n'
+
+def encode_chunk(data):
+    """编码成一个分块（事件流的响应以分块编码发送，连接可以继续复用）"""
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+def encode_event(data, event=None):
+    """编码一条SSE事件（data 为已经序列化好的单行JSON），返回可以直接写出的分块"""
+    prefix = b'event: ' + event.encode('utf-8') + b'\n' if event else b''
+    return encode_chunk(prefix + b'data: ' + data + b'\n\n')
+
+def time_event():
+    """每秒一次：编码一次，写给所有订阅者"""
+    timestamp, current_time = clock.now()
+    return encode_event(dump_json({'time': current_time, 'timestamp': int(timestamp)}), 'time')
+
+hub.add_channel(TIME_CHANNEL, TIME_INTERVAL, time_event)
+
+def event_stream(request, channel, headers=()):
+    """订阅 channel 的响应
+
+    服务器发出响应头后把连接交给 hub，之后由 hub 的事件循环写事件，
+    请求线程或服务器的事件循环不再管理这个连接。
+    """
+    request.upgrade = lambda sock: hub.subscribe(detach_socket(sock), [channel], [encode_chunk(SSE_PRELUDE)])
+    return StreamingResponse(200, (), SSE_TYPE, [('X-Accel-Buffering', 'no'), *headers])
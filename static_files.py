@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import mimetypes
+import mmap
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from caching import CachePolicy, etag_matches
+from compression import compress, is_compressible, negotiate
+from routes import Response
+from vectored import FileRegion
+
+# 不超过这个大小的文件映射进内存缓存，更大的文件用 sendfile 发送
+CACHE_FILE_SIZE = 256 * 1024
+# 内存缓存的总大小上限
+CACHE_TOTAL_SIZE = 32 * 1024 * 1024
+
+# 常见前端资源的类型，部分系统的 mimetypes 数据库里没有
+for _extension, _type in (('.js', 'application/javascript'), ('.mjs', 'application/javascript'),
+                          ('.svg', 'image/svg+xml'), ('.wasm', 'application/wasm'),
+                          ('.woff2', 'font/woff2')):
+    mimetypes.add_type(_type, _extension)
+
+class _CachedFile:
+    """缓存中的一个小文件：mmap 映射的内容和按编码缓存的压缩结果"""
+    __slots__ = ('mtime_ns', 'size', 'data', 'encoded', 'lock')
+
+    def __init__(self, mtime_ns, size, data):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        # 按编码缓存压缩后的内容，第一次请求时生成
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+class StaticFiles:
+    """静态文件服务
+
+    请求路径先做URL解码和规范化，拒绝 '..'、以 '.' 开头的隐藏文件和
+    指向目录外的符号链接。小文件 mmap 后放进 LRU 缓存，可压缩的类型
+    按编码缓存压缩结果；大文件由 os.sendfile 在内核里直接拷贝到socket。
+    支持单个 Range（206/416）、ETag/If-None-Match、Last-Modified/
+    If-Modified-Since 和 If-Range。
+    """
+
+    def __init__(self, root, max_age=3600, cache_file_size=CACHE_FILE_SIZE, cache_total_size=CACHE_TOTAL_SIZE):
+        self.root = os.path.realpath(root)
+        self.cache_policy = CachePolicy(max_age=max_age)
+        self.cache_file_size = cache_file_size
+        self.cache_total_size = cache_total_size
+        self._cache = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, url_path):
+        """把URL中的相对路径转换成根目录下的真实路径，不安全或不存在时返回 None"""
+        path = urllib.parse.unquote(url_path)
+        if '\x00' in path or '\\' in path:
+            return None
+        segments = [segment for segment in path.split('/') if segment]
+        if any(segment.startswith('.') for segment in segments):
+            return None
+        real = os.path.realpath(os.path.join(self.root, *segments))
+        if not real.startswith(self.root + os.sep):
+            return None
+        return real
+
+    def serve(self, request):
+        """处理一个静态文件请求，文件不存在时返回 None"""
+        path = self.resolve(request.params.get('path', ''))
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type = guess_type(path)
+        compressible = is_compressible(content_type)
+        cached = None
+        if stat.st_size <= self.cache_file_size:
+            cached = self._cached(path, stat)
+
+        # 小的可压缩文件按 Accept-Encoding 返回缓存的压缩版本（Range 请求除外）
+        encoding = None
+        if cached is not None and compressible and 'range' not in request.headers:
+            encoding = negotiate(request.headers.get('accept-encoding'))
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}"' if encoding else '"')
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        headers = [
+            ('Last-Modified', last_modified),
+            ('ETag', etag),
+            ('Cache-Control', self.cache_policy.cache_control),
+            ('Accept-Ranges', 'bytes'),
+        ]
+        if cached is not None and compressible:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if not_modified(request.headers, etag, stat.st_mtime):
+            return Response(304, b'', content_type, headers)
+
+        if encoding is not None:
+            body = self._encoded(cached, encoding)
+            headers.append(('Content-Encoding', encoding))
+            return Response(200, body, content_type, headers)
+
+        start, end = 0, stat.st_size
+        status = 200
+        byte_range = request.headers.get('range')
+        if byte_range and range_applies(request.headers.get('if-range'), etag, last_modified):
+            parsed = parse_range(byte_range, stat.st_size)
+            if parsed is False:
+                headers.append(('Content-Range', f'bytes */{stat.st_size}'))
+                return Response(416, b'', 'text/plain; charset=utf-8', headers)
+            if parsed is not None:
+                start, end = parsed
+                status = 206
+                headers.append(('Content-Range', f'bytes {start}-{end - 1}/{stat.st_size}'))
+
+        if cached is not None:
+            body = [memoryview(cached.data)[start:end]] if cached.size else []
+        else:
+            try:
+                body = [FileRegion(open(path, 'rb'), start, end - start)]
+            except OSError:
+                return None
+        return Response(status, body, content_type, headers)
+
+    def _cached(self, path, stat):
+        """取出（或载入）缓存的小文件，文件变化后重新映射"""
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._cache.move_to_end(path)
+                return entry
+        try:
+            with open(path, 'rb') as f:
+                # 空文件不能 mmap；映射在文件关闭后仍然有效
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        except (OSError, ValueError):
+            return None
+        entry = _CachedFile(stat.st_mtime_ns, stat.st_size, data)
+        with self._lock:
+            old = self._cache.pop(path, None)
+            if old is not None:
+                self._cache_size -= old.size
+            self._cache[path] = entry
+            self._cache_size += entry.size
+            # 淘汰最久没用的文件；正在发送的映射由引用计数保证不会提前释放
+            while self._cache_size > self.cache_total_size and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= evicted.size
+        return entry
+
+    def _encoded(self, entry, encoding):
+        body = entry.encoded.get(encoding)
+        if body is None:
+            with entry.lock:
+                body = entry.encoded.get(encoding)
+                if body is None:
+                    body = entry.encoded[encoding] = compress(bytes(entry.data), encoding)
+        return body
+
+    def stats(self):
+        """缓存状态"""
+        with self._lock:
+            return {'files': len(self._cache), 'bytes': self._cache_size}
+
+def guess_type(path):
+    """根据扩展名猜测 Content-Type，文本类型加上 utf-8 字符集"""
+    content_type, _ = mimetypes.guess_type(path)
+    if content_type is None:
+        return 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+def not_modified(headers, etag, mtime):
+    """条件请求是否可以返回 304；有 If-None-Match 时忽略 If-Modified-Since"""
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+    return False
+
+def range_applies(if_range, etag, last_modified):
+    """If-Range 与当前版本一致（或没有 If-Range）时才按 Range 返回部分内容"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # If-Range 要求强比较
+        return if_range == etag
+    return if_range == last_modified
+
+def parse_range(value, size):
+    """解析单个 'bytes=start-end' 区间
+
+    返回 (start, end)（end 不包含）；格式不支持（多个区间等）时返回 None，
+    按完整内容响应；区间无法满足时返回 False（416）。
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+        else:
+            # 'bytes=-N'：最后 N 个字节
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            start = max(size - suffix, 0)
+            end = size
+    except ValueError:
+        return None
+    if start < 0:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size)
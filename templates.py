@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import html
+import re
+from json.encoder import encode_basestring
+
+from compression import deflate_segment, stored_blocks, wrap_deflated
+
+# 模板插槽语法: {{name}} 会做HTML转义，{{name|raw}} 原样输出
+SLOT_PATTERN = re.compile(r'\{\{\s*(\w+)\s*(?:\|\s*(\w+)\s*)?\}\}')
+SLOT_TYPES = ('text', 'raw')
+
+class Template:
+    """预编译的页面模板
+
+    启动时把模板切分成已经编码好的静态字节段和插槽，
+    请求时只需要转义、编码几个动态值再拼接。静态段同时预先压缩成
+    可拼接的 deflate 块，压缩响应时只需把动态值作为不压缩的块插进去。
+    """
+
+    @staticmethod
+    def escape(value):
+        return html.escape(value)
+
+    def __init__(self, source, encoding='utf-8'):
+        self.encoding = encoding
+        self.segments = []
+        self.slots = []
+        pos = 0
+        for match in SLOT_PATTERN.finditer(source):
+            slot_type = match.group(2) or 'text'
+            if slot_type not in SLOT_TYPES:
+                raise ValueError(f"未知的插槽类型: {slot_type}")
+            self.segments.append(source[pos:match.start()].encode(encoding))
+            self.slots.append((match.group(1), slot_type == 'text'))
+            pos = match.end()
+        self.segments.append(source[pos:].encode(encoding))
+        # 每个插槽后面紧跟的静态段
+        self.tail_segments = self.segments[1:]
+        self.deflated_segments = [deflate_segment(segment) for segment in self.segments]
+
+    def _values(self, values):
+        encoded = []
+        for name, escape in self.slots:
+            value = str(values[name])
+            if escape:
+                value = self.escape(value)
+            encoded.append(value.encode(self.encoding))
+        return encoded
+
+    def render(self, **values):
+        """填充插槽，返回完整的字节内容"""
+        return b''.join(self.render_parts(None, **values))
+
+    def render_parts(self, content_encoding=None, **values):
+        """渲染成字节段列表，可以直接交给 sendmsg
+
+        静态段（或预压缩的块）直接引用缓存的对象，不会复制进新的缓冲区。
+        """
+        if content_encoding is None:
+            parts = [self.segments[0]]
+            append = parts.append
+            escape = self.escape
+            encoding = self.encoding
+            for (name, needs_escape), segment in zip(self.slots, self.tail_segments):
+                value = str(values[name])
+                if needs_escape:
+                    value = escape(value)
+                append(value.encode(encoding))
+                append(segment)
+            return parts
+        segments = self.segments
+        deflated = self.deflated_segments
+        plain_parts = [segments[0]]
+        deflated_parts = [deflated[0]]
+        for i, value in enumerate(self._values(values)):
+            plain_parts.append(value)
+            plain_parts.append(segments[i + 1])
+            deflated_parts.append(stored_blocks(value))
+            deflated_parts.append(deflated[i + 1])
+        return wrap_deflated(content_encoding, plain_parts, deflated_parts)
+
+class JSONTemplate(Template):
+    """预编译的JSON模板
+
+    {{name}} 写在JSON字符串的引号里，按JSON字符串规则转义；
+    {{name|raw}} 原样输出，用于数字或已经序列化好的片段。
+    """
+
+    @staticmethod
+    def escape(value):
+        return encode_basestring(value)[1:-1]
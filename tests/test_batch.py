@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import json
+import unittest
+
+from batch import Batch
+from http_parser import HTTPRequest
+from routes import Router, Response, StreamingResponse
+
+def make_router():
+    router = Router()
+    router.add('GET', '/small', lambda request: Response(200, b'{"ok": true}', 'application/json'))
+    router.add('GET', '/text', lambda request: Response(200, b'x' * 100, 'text/plain'))
+    router.add('GET', '/stream', lambda request: StreamingResponse(200, iter([b'a']), 'application/x-ndjson'))
+
+    def upgrade(request):
+        request.upgrade = lambda sock: None
+        return Response(101, b'')
+    router.add('GET', '/upgrade', upgrade)
+    return router
+
+def run(batch, requests, parallel=False):
+    body = json.dumps({'requests': requests, 'parallel': parallel}).encode('utf-8')
+    request = HTTPRequest('POST', '/api/batch', 'HTTP/1.1', {'content-length': str(len(body))}, body, '127.0.0.1')
+    response = batch(request)
+    return response.status, json.loads(response.body)
+
+class BatchTest(unittest.TestCase):
+    def test_inline(self):
+        status, data = run(Batch(make_router()), [{'path': '/small'}, {'path': '/text'}])
+        self.assertEqual(status, 200)
+        self.assertEqual(data['responses'][0]['body'], {'ok': True})
+        self.assertEqual(data['responses'][1]['body'], 'x' * 100)
+
+    def test_streaming_rejected(self):
+        status, data = run(Batch(make_router()), [{'path': '/stream'}, {'path': '/upgrade'}])
+        self.assertEqual(status, 200)
+        self.assertEqual([item['status'] for item in data['responses']], [400, 400])
+
+    def test_budget_checked_while_running(self):
+        # 每个 /text 内联后是102字节："x" * 100 加上引号
+        status, data = run(Batch(make_router(), max_response=250),
+                           [{'path': '/text'}, {'path': '/text'}, {'path': '/text'}, {'path': '/small'}])
+        self.assertEqual([item['status'] for item in data['responses']], [200, 200, 413, 200])
+
+    def test_stops_running_when_budget_is_spent(self):
+        router = make_router()
+        calls = []
+
+        def counted(request):
+            calls.append(request.path)
+            return Response(200, b'x' * 100, 'text/plain')
+        router.add('GET', '/counted', counted)
+        status, data = run(Batch(router, max_response=102), [{'path': '/counted'}] * 3)
+        self.assertEqual([item['status'] for item in data['responses']], [200, 413, 413])
+        self.assertEqual(len(calls), 1)
+
+    def test_parallel_budget(self):
+        status, data = run(Batch(make_router(), max_response=250), [{'path': '/text'}] * 5, parallel=True)
+        statuses = [item['status'] for item in data['responses']]
+        self.assertEqual(statuses.count(200), 2)
+        self.assertEqual(statuses.count(413), 3)
+
+if __name__ == '__main__':
+    unittest.main()
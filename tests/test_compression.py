@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import gzip
+import unittest
+
+from caching import CachePolicy, apply_cache_policy
+from compression import compress_response, MIN_SIZE
+from json_response import ConstantJSON
+
+# 序列化后超过 MIN_SIZE，会被压缩
+LARGE = ConstantJSON({'items': ['value %d' % i for i in range(MIN_SIZE // 4)]}, cache=CachePolicy(max_age=60))
+
+def etag_headers(response):
+    return [value for name, value in response.headers if name == 'ETag']
+
+class ConstantJSONCompressionTest(unittest.TestCase):
+    def test_large_enough(self):
+        self.assertGreater(len(LARGE.body), MIN_SIZE)
+
+    def test_identity_keeps_precomputed_etag(self):
+        response = compress_response(LARGE.response(), None)
+        self.assertEqual(etag_headers(response), [LARGE.etag])
+        response = apply_cache_policy(response, 'GET', LARGE.etag)
+        self.assertEqual(response.status, 304)
+
+    def test_gzip_gets_its_own_etag(self):
+        response = compress_response(LARGE.response(), 'gzip')
+        self.assertEqual(gzip.decompress(response.body), LARGE.body)
+        self.assertEqual(etag_headers(response), [response.etag])
+        self.assertNotEqual(response.etag, LARGE.etag)
+        # 共享的常量响应头没有被修改
+        self.assertEqual(etag_headers(LARGE.response()), [LARGE.etag])
+
+    def test_if_none_match_respects_encoding(self):
+        gzip_etag = compress_response(LARGE.response(), 'gzip').etag
+        # 缓存的是未压缩的版本，请求压缩版本时不能返回304，反过来也一样
+        response = apply_cache_policy(compress_response(LARGE.response(), 'gzip'), 'GET', LARGE.etag)
+        self.assertEqual(response.status, 200)
+        response = apply_cache_policy(compress_response(LARGE.response(), None), 'GET', gzip_etag)
+        self.assertEqual(response.status, 200)
+        response = apply_cache_policy(compress_response(LARGE.response(), 'gzip'), 'GET', gzip_etag)
+        self.assertEqual(response.status, 304)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import unittest
+
+from http_parser import RequestParser, HTTPParseError, parse_chunk_size
+
+def chunked(*lines):
+    return (b'POST /api/greet HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n'
+            + b''.join(line + b'\r\n' for line in lines))
+
+class ChunkSizeTest(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(parse_chunk_size(b'1a'), 26)
+        self.assertEqual(parse_chunk_size(b'FF'), 255)
+        self.assertEqual(parse_chunk_size(b'5;name=value'), 5)
+        self.assertEqual(parse_chunk_size(b'5 ;name'), 5)
+        self.assertEqual(parse_chunk_size(b'0'), 0)
+
+    def test_rejected(self):
+        # int(x, 16) 接受这些写法，HTTP 的语法不接受
+        for line in (b'0x5', b'+2', b'-2', b'1_0', b' 5', b'5 ', b'\t5', b'', b';ext', b'zz',
+                     b'1' * 17, b'\xd9\xa5'):
+            with self.subTest(line=line):
+                with self.assertRaises(HTTPParseError) as cm:
+                    parse_chunk_size(line)
+                self.assertEqual(cm.exception.status, 400)
+
+class RequestParserChunkedTest(unittest.TestCase):
+    def test_valid_body(self):
+        parser = RequestParser()
+        requests = parser.feed(chunked(b'5', b'{"a":', b'2;x=y', b'1}', b'0', b''))
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0].body, b'{"a":1}')
+
+    def test_rejected_sizes(self):
+        for size in (b'0x5', b'+2', b'1_0', b' 5'):
+            with self.subTest(size=size):
+                with self.assertRaises(HTTPParseError) as cm:
+                    RequestParser().feed(chunked(size, b'{"a":', b'0', b''))
+                self.assertEqual(cm.exception.status, 400)
+
+    def test_smuggled_sizes_stop_pipeline(self):
+        # 前面的请求照常返回，格式错误的请求体不能让后面的管线化请求被解析
+        parser = RequestParser()
+        data = (b'GET /api/hello HTTP/1.1\r\nHost: x\r\n\r\n'
+                + chunked(b'0x5', b'{"a":', b'+2', b'1}', b'0', b'')
+                + b'GET /api/time HTTP/1.1\r\nHost: x\r\n\r\n')
+        requests = parser.feed(data)
+        self.assertEqual([request.path for request in requests], ['/api/hello'])
+        self.assertEqual(parser.error.status, 400)
+
+if __name__ == '__main__':
+    unittest.main()
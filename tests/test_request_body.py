@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import io
+import unittest
+
+from http_parser import HTTPParseError
+from request_body import BodyReader
+
+CHUNKED = {'transfer-encoding': 'chunked'}
+
+def reader(data, headers=CHUNKED, **kwargs):
+    return BodyReader(io.BufferedReader(io.BytesIO(data)), headers, **kwargs)
+
+class BodyReaderChunkedTest(unittest.TestCase):
+    def test_valid_body(self):
+        body = reader(b'5\r\n{"a":\r\n2;x=y\r\n1}\r\n0\r\n\r\n')
+        self.assertEqual(body.read(), b'{"a":1}')
+        self.assertTrue(body.done)
+
+    def test_rejected_sizes(self):
+        for size in (b'0x5', b'+5', b'1_0', b' 5', b'5 ', b'zz'):
+            with self.subTest(size=size):
+                with self.assertRaises(HTTPParseError) as cm:
+                    reader(size + b'\r\n{"a":\r\n0\r\n\r\n').read()
+                self.assertEqual(cm.exception.status, 400)
+
+    def test_content_length(self):
+        body = reader(b'hello', {'content-length': '5'})
+        self.assertEqual(body.read(), b'hello')
+        with self.assertRaises(HTTPParseError) as cm:
+            reader(b'hello', {'content-length': '5'}, max_size=4)
+        self.assertEqual(cm.exception.status, 413)
+
+if __name__ == '__main__':
+    unittest.main()
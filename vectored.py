@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import os
+import socket
+
+# 一次 sendmsg 最多携带的缓冲区数量（内核的 IOV_MAX）
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+HAS_SENDFILE = hasattr(os, 'sendfile')
+
+class FileRegion:
+    """响应体中的一段文件内容，发送时由 sendfile 在内核里直接拷贝到socket
+
+    发送完成（或连接关闭）后由写出方调用 close() 关闭文件。
+    """
+    __slots__ = ('file', 'offset', 'count')
+
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def send(self, sock):
+        """向非阻塞socket发送一次，返回发送的字节数"""
+        if HAS_SENDFILE:
+            sent = os.sendfile(sock.fileno(), self.file.fileno(), self.offset, self.count)
+        else:
+            self.file.seek(self.offset)
+            sent = sock.send(self.file.read(min(self.count, 65536)))
+        if sent == 0:
+            raise OSError("文件在发送过程中被截断")
+        return sent
+
+    def close(self):
+        self.file.close()
+
+def as_views(buffers):
+    """把 bytes 列表转成 memoryview 列表，跳过空缓冲区（不复制数据）；FileRegion 原样保留"""
+    views = []
+    for buffer in buffers:
+        if isinstance(buffer, FileRegion):
+            if buffer.count:
+                views.append(buffer)
+            else:
+                buffer.close()
+        elif buffer:
+            views.append(memoryview(buffer))
+    return views
+
+def close_regions(views):
+    """关闭还没发送完的文件"""
+    for view in views:
+        if isinstance(view, FileRegion):
+            view.close()
+
+def advance(views, sent):
+    """原地丢掉已经发送的 sent 字节（部分发送的缓冲区只切片，不复制）"""
+    index = 0
+    while sent:
+        part = views[index]
+        size = len(part)
+        if sent < size:
+            if isinstance(part, FileRegion):
+                part.offset += sent
+                part.count -= sent
+            else:
+                views[index] = part[sent:]
+            break
+        sent -= size
+        if isinstance(part, FileRegion):
+            part.close()
+        index += 1
+    if index:
+        del views[:index]
+
+def send_some(sock, views):
+    """发送一次，原地去掉已发送的部分，返回发送的字节数
+
+    连续的内存缓冲区用一次 sendmsg 提交，文件段用 sendfile。
+    非阻塞socket写不下时抛出 BlockingIOError，由调用者等待可写事件。
+    """
+    first = views[0]
+    if isinstance(first, FileRegion):
+        sent = first.send(sock)
+    elif HAS_SENDMSG:
+        batch = []
+        for view in views:
+            if isinstance(view, FileRegion) or len(batch) == IOV_MAX:
+                break
+            batch.append(view)
+        sent = sock.sendmsg(batch)
+    else:
+        sent = sock.send(first)
+    advance(views, sent)
+    return sent
+
+def send_buffers(sock, buffers):
+    """把多个缓冲区依次写进阻塞socket（writev），相当于多个 sendall
+
+    响应头和缓存的静态段直接交给内核，不先拼成一个大缓冲区；
+    文件段交给 socket.sendfile（带超时的socket也能正确等待）。
+    """
+    views = as_views(buffers)
+    try:
+        while views:
+            first = views[0]
+            if isinstance(first, FileRegion):
+                sent = sock.sendfile(first.file, first.offset, first.count)
+                if sent < first.count:
+                    raise OSError("文件在发送过程中被截断")
+                first.close()
+                del views[0]
+            else:
+                send_some(sock, views)
+    finally:
+        close_regions(views)
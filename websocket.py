@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import base64
+import binascii
+import hashlib
+import json
+import struct
+import time
+
+from broadcast import hub, detach_socket
+from clock import clock
+from json_response import JSON_TYPE, dump_json
+from routes import Response
+
+# RFC 6455 握手中拼在 Sec-WebSocket-Key 后面的固定GUID
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# 关闭码
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_UNSUPPORTED = 1003
+CLOSE_INVALID_DATA = 1007
+CLOSE_TOO_BIG = 1009
+
+# 单条消息（分片合并后）的最大长度
+MAX_MESSAGE_SIZE = 64 * 1024
+# 每隔多久发一次 ping，超过两个间隔没有收到任何数据的连接被断开
+PING_INTERVAL = 20
+# 状态广播的间隔（秒）
+STATUS_INTERVAL = 5
+
+TIME_CHANNEL = 'ws_time'
+STATUS_CHANNEL = 'ws_status'
+PING_CHANNEL = 'ws_ping'
+
+def accept_key(key):
+    """Sec-WebSocket-Accept = base64(sha1(key + GUID))"""
+    return base64.b64encode(hashlib.sha1(key.encode('latin-1') + WS_GUID).digest()).decode('ascii')
+
+def encode_frame(payload, opcode=OP_TEXT):
+    """编码一个服务器发出的帧（不带掩码），广播时所有连接共享同一份字节"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+def encode_message(kind, data):
+    """{"type": kind, "data": data} 文本帧，data 是已经序列化好的JSON字节"""
+    return encode_frame(b'{"type": "' + kind.encode('ascii') + b'", "data": ' + data + b'}')
+
+def close_frame(code, reason=''):
+    return encode_frame(struct.pack('!H', code) + reason.encode('utf-8')[:123], OP_CLOSE)
+
+PING_FRAME = encode_frame(b'', OP_PING)
+
+class WebSocketError(Exception):
+    """对端违反协议，code 是关闭帧里的关闭码"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+class FrameParser:
+    """增量式帧解析器：feed() 返回完整的 (opcode, payload) 列表
+
+    客户端的帧必须带掩码；分片的消息合并后再返回，控制帧可以插在
+    分片之间。消息超过 max_size 时抛出 WebSocketError(1009)，缓冲的
+    数据不会超过一个帧头加 max_size。
+    """
+
+    def __init__(self, max_size=MAX_MESSAGE_SIZE):
+        self.max_size = max_size
+        self._buffer = bytearray()
+        self._fragments = []
+        self._fragment_opcode = None
+        self._fragment_size = 0
+
+    def feed(self, data):
+        self._buffer += data
+        messages = []
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return messages
+            message = self._assemble(*frame)
+            if message is not None:
+                messages.append(message)
+
+    def _read_frame(self):
+        buffer = self._buffer
+        if len(buffer) < 2:
+            return None
+        first, second = buffer[0], buffer[1]
+        if first & 0x70:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, "不支持扩展位")
+        fin = bool(first & 0x80)
+        opcode = first & 0x0F
+        if not second & 0x80:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, "客户端的帧必须带掩码")
+        length = second & 0x7F
+        pos = 2
+        if length == 126:
+            if len(buffer) < 4:
+                return None
+            length = struct.unpack_from('!H', buffer, 2)[0]
+            pos = 4
+        elif length == 127:
+            if len(buffer) < 10:
+                return None
+            length = struct.unpack_from('!Q', buffer, 2)[0]
+            pos = 10
+        if opcode >= OP_CLOSE:
+            if length > 125 or not fin:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR, "控制帧格式错误")
+        elif self._fragment_size + length > self.max_size:
+            raise WebSocketError(CLOSE_TOO_BIG, "消息过大")
+        if len(buffer) < pos + 4 + length:
+            return None
+        mask = buffer[pos:pos + 4]
+        pos += 4
+        payload = bytes(buffer[pos:pos + length])
+        del buffer[:pos + length]
+        if length:
+            # 用整数异或一次去掉掩码，不逐字节循环
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+            payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+        return fin, opcode, payload
+
+    def _assemble(self, fin, opcode, payload):
+        if opcode >= OP_CLOSE:
+            return opcode, payload
+        if opcode == OP_CONTINUATION:
+            if self._fragment_opcode is None:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR, "没有开始的分片")
+        elif opcode in (OP_TEXT, OP_BINARY):
+            if self._fragment_opcode is not None:
+                raise WebSocketError(CLOSE_PROTOCOL_ERROR, "上一条分片消息还没结束")
+            if fin:
+                return opcode, payload
+            self._fragment_opcode = opcode
+        else:
+            raise WebSocketError(CLOSE_PROTOCOL_ERROR, f"未知的操作码: {opcode}")
+        self._fragments.append(payload)
+        self._fragment_size += len(payload)
+        if not fin:
+            return None
+        message = (self._fragment_opcode, b''.join(self._fragments))
+        self._fragments = []
+        self._fragment_opcode = None
+        self._fragment_size = 0
+        return message
+
+class WebSocketState:
+    """hub 里一个 WebSocket 连接的状态"""
+    __slots__ = ('parser', 'last_seen', 'closing')
+
+    def __init__(self):
+        self.parser = FrameParser()
+        self.last_seen = time.monotonic()
+        self.closing = False
+
+def greet(data):
+    """和 server.py 的 /api/greet 相同的问候"""
+    name = data.get('name', 'Anonymous')
+    return dump_json({'greeting': f'你好, {name}!', 'received_data': data, 'timestamp': clock.now_str()})
+
+def handle_message(opcode, payload):
+    """处理一条客户端消息，返回要回复的帧（没有回复时返回 None）"""
+    if opcode != OP_TEXT:
+        raise WebSocketError(CLOSE_UNSUPPORTED, "只支持文本消息")
+    try:
+        text = payload.decode('utf-8')
+    except UnicodeDecodeError:
+        raise WebSocketError(CLOSE_INVALID_DATA, "文本消息不是有效的UTF-8")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return encode_message('error', dump_json('Invalid JSON'))
+    if not isinstance(data, dict):
+        return encode_message('error', dump_json('消息必须是JSON对象'))
+    kind = data.get('type')
+    if kind == 'greet':
+        return encode_message('greeting', greet(data))
+    if kind == 'ping':
+        return encode_message('pong', dump_json(clock.now_str()))
+    return encode_message('error', dump_json(f'未知的消息类型: {kind}'))
+
+def on_data(hub, subscriber, data):
+    """hub 事件循环里收到客户端数据"""
+    state = subscriber.state
+    if state.closing:
+        return
+    state.last_seen = time.monotonic()
+    try:
+        for opcode, payload in state.parser.feed(data):
+            if opcode == OP_PING:
+                hub.send(subscriber, encode_frame(payload, OP_PONG))
+            elif opcode == OP_PONG:
+                pass
+            elif opcode == OP_CLOSE:
+                # 回复同样的关闭码后断开
+                state.closing = True
+                hub.send(subscriber, encode_frame(payload[:2], OP_CLOSE))
+                hub.close(subscriber)
+                return
+            else:
+                reply = handle_message(opcode, payload)
+                if reply is not None:
+                    hub.send(subscriber, reply)
+    except WebSocketError as e:
+        state.closing = True
+        hub.send(subscriber, close_frame(e.code, str(e)))
+        hub.close(subscriber)
+
+def time_frame():
+    """每秒一次的时间广播，编码一次写给所有连接"""
+    timestamp, current_time = clock.now()
+    return encode_message('time', dump_json({'time': current_time, 'timestamp': int(timestamp)}))
+
+def ping_frame():
+    """定时 ping；两个间隔内没有任何数据（包括 pong）的连接被断开"""
+    channel = hub.channels[PING_CHANNEL]
+    stale = time.monotonic() - 2 * PING_INTERVAL
+    for subscriber in list(channel.subscribers):
+        state = subscriber.state
+        if state.last_seen < stale and not state.closing:
+            state.closing = True
+            hub.send(subscriber, close_frame(CLOSE_NORMAL, 'ping timeout'))
+            hub.close(subscriber)
+    return PING_FRAME
+
+hub.add_channel(TIME_CHANNEL, 1, time_frame)
+hub.add_channel(PING_CHANNEL, PING_INTERVAL, ping_frame)
+
+def add_status_source(status_json, interval=STATUS_INTERVAL):
+    """注册状态广播：status_json() 返回 /api/status 的JSON字节（广播中没有客户端地址）"""
+    hub.add_channel(STATUS_CHANNEL, interval, lambda: encode_message('status', status_json()))
+
+def websocket_upgrade(request):
+    """校验 WebSocket 握手，成功时返回 101 并在响应头发出后把连接交给 hub
+
+    连接订阅时间、状态和 ping 广播，客户端可以发送
+    {"type": "greet", "name": ...}，回复和 /api/greet 相同的问候。
+    """
+    headers = request.headers
+    upgrade = headers.get('upgrade', '').lower()
+    connection = [token.strip() for token in headers.get('connection', '').lower().split(',')]
+    if 'websocket' not in upgrade or 'upgrade' not in connection:
+        return Response(426, dump_json({'error': 'WebSocket upgrade required'}), JSON_TYPE,
+                        [('Upgrade', 'websocket'), ('Sec-WebSocket-Version', '13')])
+    if request.method != 'GET' or request.version != 'HTTP/1.1':
+        return Response(400, dump_json({'error': 'WebSocket handshake requires GET over HTTP/1.1'}), JSON_TYPE)
+    if headers.get('sec-websocket-version', '').strip() != '13':
+        return Response(426, dump_json({'error': 'Unsupported WebSocket version'}), JSON_TYPE,
+                        [('Sec-WebSocket-Version', '13')])
+    key = headers.get('sec-websocket-key', '').strip()
+    try:
+        if len(base64.b64decode(key, validate=True)) != 16:
+            raise ValueError(key)
+    except (binascii.Error, ValueError):
+        return Response(400, dump_json({'error': 'Invalid Sec-WebSocket-Key'}), JSON_TYPE)
+
+    request.upgrade = lambda sock: hub.subscribe(detach_socket(sock), [TIME_CHANNEL, STATUS_CHANNEL, PING_CHANNEL],
+                                                 on_data=on_data, state=WebSocketState())
+    return Response(101, b'', JSON_TYPE, [('Upgrade', 'websocket'), ('Connection', 'Upgrade'),
+                                          ('Sec-WebSocket-Accept', accept_key(key))])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import queue
+import threading
+
+from admission import shed_connection
+
+# 队列满时的溢出策略
+OVERFLOW_POLICIES = ('block', 'shed', 'close')
+
+class WorkerPool:
+    """固定数量的工作线程，从有界队列中取连接处理"""
+
+    def __init__(self, handler, size=16, queue_size=64, overflow='block'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        if size < 1:
+            raise ValueError("工作线程数量必须大于0")
+        if queue_size < 1:
+            raise ValueError("队列长度必须大于0")
+        self.handler = handler
+        self.size = size
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._rejected = 0
+        self._workers = []
+
+    def start(self):
+        """启动所有工作线程"""
+        for i in range(self.size):
+            worker = threading.Thread(
+                target=self._run,
+                name=f"worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def submit(self, client_socket, client_address):
+        """把连接交给线程池，被拒绝时返回False"""
+        if self.overflow == 'block':
+            self._queue.put((client_socket, client_address))
+            return True
+
+        try:
+            self._queue.put_nowait((client_socket, client_address))
+            return True
+        except queue.Full:
+            pass
+
+        with self._lock:
+            self._rejected += 1
+        if self.overflow == 'shed':
+            shed_connection(client_socket, client_address)
+            return False
+        try:
+            client_socket.close()
+        except:
+            pass
+        return False
+
+    def submit_batch(self, connections):
+        """一次交出一批连接，返回被接收的数量"""
+        accepted = 0
+        for client_socket, client_address in connections:
+            if self.submit(client_socket, client_address):
+                accepted += 1
+        return accepted
+
+    def stats(self):
+        """返回线程池当前状态"""
+        with self._lock:
+            busy = self._busy
+            rejected = self._rejected
+        return {
+            'workers': self.size,
+            'busy': busy,
+            'queued': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'overflow': self.overflow,
+            'rejected': rejected,
+        }
+
+    def shutdown(self):
+        """通知所有工作线程退出"""
+        for _ in self._workers:
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handler(*item)
+            except Exception as e:
+                print(f"工作线程处理连接时出错: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1